@@ -0,0 +1,373 @@
+import asyncio
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+from urllib.parse import quote
+
+import aiohttp
+from asnake.aspace import ASpace
+from asnake.client import ASnakeClient
+from django.utils import timezone
+from electronbonder.client import ElectronBond
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+from pisces import settings
+
+from .concurrency import request_kind
+from .models import SessionToken
+from .resilience import aspace_upstream, cartographer_upstream
+
+
+class AsyncClientError(Exception):
+    pass
+
+
+class AsyncClient:
+    """Base asynchronous HTTP client.
+
+    Wraps an aiohttp ClientSession, which keeps a pool of connections open
+    for as long as the client is in use. No more than CONNECTION_POOL_SIZE
+    requests are sent at once, and requests without an upstream use the
+    default upstream timeout. Clients must be used as async context managers
+    so that the session is created and closed inside the event loop.
+
+    Args:
+        baseurl (str): base URL which is prepended to all requested paths.
+        upstream (Upstream): optional resilience policy for requests.
+    """
+
+    def __init__(self, baseurl, upstream=None):
+        self.baseurl = baseurl.rstrip("/")
+        self.upstream = upstream
+        self.session = None
+
+    async def __aenter__(self):
+        timeout = self.upstream.timeout if self.upstream else settings.UPSTREAM["timeout"]
+        self.session = aiohttp.ClientSession(
+            headers={"Accept": "application/json"},
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+            connector=aiohttp.TCPConnector(limit=settings.CONNECTION_POOL_SIZE))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def full_url(self, url):
+        return "/".join([self.baseurl, url.lstrip("/")])
+
+    def prepare_params(self, params):
+        """Coerces request parameters into a list of string tuples."""
+        return [(k, str(v)) for k, v in (params or {}).items()]
+
+    def get_headers(self):
+        return {}
+
+    async def request(self, url, params=None):
+        def send():
+            return self.session.get(
+                self.full_url(url),
+                params=self.prepare_params(params),
+                headers=self.get_headers())
+        if not self.upstream:
+            return await send()
+        return await self.upstream.call_async(
+            send, True, (aiohttp.ClientConnectionError, asyncio.TimeoutError), lambda r: r.status,
+            request_kind(url, params))
+
+    async def get(self, url, params=None):
+        """Returns parsed JSON from a GET request."""
+        resp = await self.request(url, params)
+        async with resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def get_id_list(self, url, params=None):
+        """Returns a JSON list of integers from a GET request as a compact array.
+
+        The response is parsed as it is received, so neither the response body
+        nor a list of Python integers is held in memory.
+        """
+        ids = array("q")
+        remainder = b""
+        resp = await self.request(url, params)
+        async with resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(65536):
+                values = (remainder + chunk).split(b",")
+                remainder = values.pop()
+                ids.extend(int(v.strip(b"[] \r\n\t")) for v in values)
+        remainder = remainder.strip(b"[] \r\n\t")
+        if remainder:
+            ids.append(int(remainder))
+        return ids
+
+
+class AsyncArchivesSpaceClient(AsyncClient):
+    """Asynchronous ArchivesSpace client.
+
+    Reuses an existing session token if one is provided, otherwise logs in the
+    first time a request is made. Requests which fail because the session has
+    expired are retried once with a new session token.
+
+    Args:
+        baseurl (str): base URL for the ArchivesSpace API.
+        username (str): ArchivesSpace username.
+        password (str): ArchivesSpace password.
+        session_token (str): optional existing session token.
+        upstream (Upstream): optional resilience policy for requests.
+        record_cache_size (int): maximum number of records kept by `get_record`.
+    """
+
+    def __init__(self, baseurl, username, password, session_token=None, upstream=None, record_cache_size=0):
+        super().__init__(baseurl, upstream)
+        self.username = username
+        self.password = password
+        self.session_token = session_token
+        self.auth_lock = asyncio.Lock()
+        self.record_cache_size = record_cache_size
+        self.records = OrderedDict()
+
+    def prepare_params(self, params):
+        """Formats request parameters the way ArchivesSpace expects them.
+
+        List values are sent as repeated parameters whose names end in `[]`,
+        mirroring the behavior of ASnake.
+        """
+        prepared = []
+        for key, value in (params or {}).items():
+            if isinstance(value, (list, tuple)):
+                key = key if key.endswith("[]") else "{}[]".format(key)
+                prepared += [(key, str(v)) for v in value]
+            else:
+                prepared.append((key, str(value)))
+        return prepared
+
+    def get_headers(self):
+        return {"X-ArchivesSpace-Session": self.session_token} if self.session_token else {}
+
+    async def authorize(self, expired_token=None):
+        """Logs in to ArchivesSpace and stores the returned session token.
+
+        Args:
+            expired_token (str): the token which was rejected. If another
+                request has already replaced it, no new login is made.
+        """
+        async with self.auth_lock:
+            if self.session_token and self.session_token != expired_token:
+                return self.session_token
+            resp = await self.session.post(
+                self.full_url("users/{}/login".format(quote(self.username))),
+                data={"password": self.password, "expiring": "false"})
+            async with resp:
+                if resp.status != 200:
+                    raise AsyncClientError(
+                        "Failed to authorize against ArchivesSpace with status: {}".format(resp.status))
+                self.session_token = (await resp.json(content_type=None))["session"]
+            return self.session_token
+
+    async def request(self, url, params=None):
+        if not self.session_token:
+            await self.authorize()
+        token = self.session_token
+        resp = await super().request(url, params)
+        if resp.status == 403:
+            resp.release()
+            await self.authorize(expired_token=token)
+            resp = await super().request(url, params)
+        return resp
+
+    async def get_record(self, url, params=None):
+        """Returns parsed JSON for a record, which is only requested once while
+        the client is open.
+
+        Concurrent calls for the same record wait for the same request.
+        """
+        key = (url, tuple(self.prepare_params(params)))
+        record = self.records.get(key)
+        if record:
+            self.records.move_to_end(key)
+        else:
+            record = asyncio.ensure_future(self.get(url, params=params))
+            self.records[key] = record
+            while len(self.records) > self.record_cache_size:
+                self.records.popitem(last=False)
+        try:
+            return await record
+        except Exception:
+            if self.records.get(key) is record:
+                del self.records[key]
+            raise
+
+    async def get_paged(self, url, params=None, page_size=100):
+        """Yields objects from all pages of a paged ArchivesSpace endpoint."""
+        params = dict(params or {}, page_size=page_size, page=1)
+        while True:
+            current = await self.get(url, params=params)
+            for obj in current["results"]:
+                yield obj
+            if current["this_page"] >= current["last_page"]:
+                break
+            params["page"] += 1
+
+
+class AsyncCartographerClient(AsyncClient):
+    """Asynchronous Cartographer client."""
+    pass
+
+
+class AsyncAssetClient(AsyncClient):
+    """Asynchronous client for the server which hosts online assets."""
+
+    async def has_asset(self, identifier):
+        """Returns True if an asset is available for an identifier."""
+        resp = await self.session.head(self.full_url("pdfs/{}".format(identifier)))
+        async with resp:
+            return resp.status == 200
+
+
+class UpstreamHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter which sends requests according to an upstream's resilience policy.
+
+    Args:
+        upstream (Upstream): resilience policy for requests.
+    """
+
+    def __init__(self, upstream, **kwargs):
+        self.upstream = upstream
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        kwargs["timeout"] = kwargs.get("timeout") or self.upstream.timeout
+        return self.upstream.call(
+            lambda: super(UpstreamHTTPAdapter, self).send(request, **kwargs),
+            request.method in ("GET", "HEAD"),
+            (ConnectionError, Timeout),
+            lambda r: r.status_code,
+            request_kind(request.url))
+
+
+class PooledASnakeClient(ASnakeClient):
+    """ASnake client which gets its session token from a ClientManager."""
+
+    def __init__(self, manager, **config):
+        self.manager = manager
+        super().__init__(**config)
+
+    def authorize(self, username=None, password=None):
+        """Sets a session token shared with other clients.
+
+        Called by ASnake when a request is rejected, in which case the rejected
+        token is passed on so that it is not reused.
+        """
+        token = self.manager.get_session_token(
+            self, expired_token=self.session.headers.get("X-ArchivesSpace-Session"))
+        self.session.headers["X-ArchivesSpace-Session"] = token
+        return token
+
+    def login(self):
+        """Logs in to ArchivesSpace and returns a new session token."""
+        return super().authorize()
+
+
+class PooledASpace(ASpace):
+    """ASpace object which wraps an existing client rather than logging in."""
+
+    def __init__(self, client):
+        self.client = client
+
+
+class ClientManager:
+    """Manages clients for upstream services.
+
+    Owns a single keep-alive connection pool per upstream service, which is
+    shared by all clients. Each thread gets its own clients, so that request
+    sessions are never shared between threads. ArchivesSpace session tokens are
+    stored in the database, and are reused across runs and processes until they
+    expire.
+    """
+
+    health_check_interval = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.session_token = None
+        self.session_expires = None
+        self.last_health_check = None
+        self.adapters = {
+            "aspace": UpstreamHTTPAdapter(
+                aspace_upstream,
+                pool_maxsize=settings.CONNECTION_POOL_SIZE),
+            "cartographer": UpstreamHTTPAdapter(
+                cartographer_upstream,
+                pool_maxsize=settings.CONNECTION_POOL_SIZE),
+        }
+
+    def clients(self):
+        """Returns a dict of clients for use by the current thread."""
+        if not hasattr(self.local, "clients"):
+            clients = {"aspace": self.aspace_client()}
+            if settings.CARTOGRAPHER["cartographer_use"]:
+                clients["cartographer"] = self.cartographer_client()
+            self.local.clients = clients
+        return self.local.clients
+
+    def aspace_client(self):
+        config = settings.ARCHIVESSPACE
+        client = PooledASnakeClient(
+            self,
+            baseurl=config["baseurl"],
+            username=config["username"],
+            password=config["password"])
+        client.session.mount(config["baseurl"], self.adapters["aspace"])
+        client.authorize()
+        return PooledASpace(client)
+
+    def cartographer_client(self):
+        config = settings.CARTOGRAPHER
+        client = ElectronBond(baseurl=config["baseurl"])
+        client.session.mount(config["baseurl"], self.adapters["cartographer"])
+        with self.lock:
+            if not self.last_health_check or (time.monotonic() - self.last_health_check > self.health_check_interval):
+                try:
+                    resp = client.get(config["health_check_path"])
+                    resp.raise_for_status()
+                except Exception as e:
+                    raise Exception("Cartographer is not available: {}".format(e))
+                self.last_health_check = time.monotonic()
+        return client
+
+    def get_session_token(self, client, expired_token=None):
+        """Returns a valid ArchivesSpace session token.
+
+        Tokens are taken from memory, then from the database and finally by
+        logging in.
+
+        Args:
+            client (PooledASnakeClient): client used to log in if necessary.
+            expired_token (str): a token which has been rejected by ArchivesSpace.
+        """
+        config = settings.ARCHIVESSPACE
+        with self.lock:
+            if self.session_token and self.session_token != expired_token and self.session_expires > timezone.now():
+                return self.session_token
+            stored = SessionToken.objects.filter(
+                baseurl=config["baseurl"],
+                username=config["username"],
+                expires__gt=timezone.now()).exclude(token=expired_token).first()
+            if stored:
+                self.session_token, self.session_expires = stored.token, stored.expires
+            else:
+                self.session_token = client.login()
+                self.session_expires = timezone.now() + timedelta(seconds=config["session_expiry"])
+                SessionToken.objects.update_or_create(
+                    baseurl=config["baseurl"],
+                    username=config["username"],
+                    defaults={"token": self.session_token, "expires": self.session_expires})
+            return self.session_token
+
+
+client_manager = ClientManager()
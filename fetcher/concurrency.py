@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from collections import deque
+
+from pisces import settings
+
+
+class AdaptiveLimiter:
+    """Limits the number of requests in flight to an upstream service.
+
+    The limit is adjusted using additive increase, multiplicative decrease
+    (AIMD). While requests succeed and latency stays close to the lowest latency
+    seen, the limit grows by roughly one request for each round of requests.
+    When a request fails or times out, or the 95th percentile latency rises
+    above `latency_tolerance` times its lowest value, the limit is halved. The
+    limit is decreased at most once per round of requests, so that a burst of
+    failures caused by one overload is only counted once.
+
+    Latency is tracked separately for each kind of request, so that slow
+    requests for pages of records are not compared with quick lookups. If
+    latency stays high for `baseline_windows` windows in a row, the lowest
+    latency is reset to the current latency, so that the limit can grow again.
+
+    The limiter can be shared between threads and event loops.
+
+    Args:
+        min_limit (int): the lowest number of concurrent requests.
+        max_limit (int): the highest number of concurrent requests.
+        latency_tolerance (float): the ratio of current to lowest p95 latency
+            above which the limit is decreased.
+        window (int): the number of recent requests used to calculate latency.
+        baseline_windows (int): the number of windows in a row with high
+            latency after which the lowest latency is reset.
+    """
+
+    backoff = 0.5
+
+    def __init__(self, min_limit, max_limit, latency_tolerance=2.0, window=50, baseline_windows=5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.window = window
+        self.baseline_windows = baseline_windows
+        self.limit = float(min_limit)
+        self.in_flight = 0
+        self.latencies = {}
+        self.lowest_p95 = {}
+        self.slow_windows = {}
+        self.since_decrease = 0
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.async_waiters = []
+
+    def has_capacity(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self):
+        """Waits until a request can be made."""
+        with self.condition:
+            while not self.has_capacity():
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """Waits until a request can be made without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.lock:
+                if self.has_capacity():
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self.async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, latency=None, failed=False, kind=None):
+        """Records the outcome of a request and adjusts the limit.
+
+        Args:
+            latency (float): seconds taken by the request.
+            failed (bool): True if the request failed in a way which indicates
+                the upstream service is overloaded.
+            kind (str): the kind of request, as returned by `request_kind`.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.since_decrease += 1
+            if failed:
+                self.decrease()
+            elif latency is not None:
+                self.record_latency(latency, kind)
+            self.condition.notify_all()
+            waiters, self.async_waiters = self.async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(self.wake, waiter)
+
+    def record_latency(self, latency, kind):
+        """Adjusts the limit by comparing latency with the lowest latency seen
+        for the same kind of request."""
+        latencies = self.latencies.setdefault(kind, deque(maxlen=self.window))
+        latencies.append(latency)
+        p95 = self.p95(latencies)
+        lowest = self.lowest_p95.get(kind)
+        if p95 is not None and lowest is not None and p95 > lowest * self.latency_tolerance:
+            if self.decrease():
+                self.slow_windows[kind] = self.slow_windows.get(kind, 0) + 1
+                if self.slow_windows[kind] >= self.baseline_windows:
+                    self.lowest_p95[kind] = p95
+                    self.slow_windows[kind] = 0
+        else:
+            if p95 is not None:
+                self.lowest_p95[kind] = p95 if lowest is None else min(lowest, p95)
+                self.slow_windows[kind] = 0
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def decrease(self):
+        """Halves the limit unless it was decreased during the current round of
+        requests, returning True if it was decreased."""
+        if self.since_decrease < self.limit:
+            return False
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.since_decrease = 0
+        for latencies in self.latencies.values():
+            latencies.clear()
+        return True
+
+    def p95(self, latencies):
+        """Returns the 95th percentile latency once a window is full."""
+        if len(latencies) < latencies.maxlen:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    @staticmethod
+    def wake(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+def request_kind(url, params=None):
+    """Returns the kind of a request, which is either a page of records
+    requested by id, or any other request."""
+    return "id_set" if "id_set" in (params or {}) or "id_set" in url else None
+
+
+aspace_limiter = AdaptiveLimiter(
+    settings.ARCHIVESSPACE["concurrency_min"],
+    settings.ARCHIVESSPACE["concurrency_max"],
+    settings.ARCHIVESSPACE["latency_tolerance"])
@@ -1,43 +1,92 @@
+import os
+import socket
+import threading
 from datetime import datetime
-from subprocess import CalledProcessError, check_output
+from functools import partial
+from itertools import groupby
 
+from django.db import connection
 from django_cron import CronJobBase, Schedule
 
+from pisces import settings
+
 from .fetchers import ArchivesSpaceDataFetcher, CartographerDataFetcher
-from .models import FetchRun
+from .helpers import (acquire_lease, claim_jobs, release_lease, renew_jobs,
+                      renew_lease)
+from .models import FetchJob, FetchRun
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Renews a lease until it is stopped.
+
+    Args:
+        renew (callable): renews the lease, returning a falsy value once it is
+            no longer held.
+        interval (float): number of seconds between renewals.
+        description (str): description of the lease used in messages.
+    """
+
+    def __init__(self, renew, interval, description):
+        super().__init__(daemon=True)
+        self.renew = renew
+        self.interval = interval
+        self.description = description
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                if not self.renew():
+                    print("Lease for {} lost".format(self.description))
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
 
 
 class BaseCron(CronJobBase):
+    """Fetches and processes data.
+
+    Only one process on any host runs a job at a time. The process holds a
+    lease on the job's code while it runs, which is taken over by another
+    process if it expires without being renewed.
+    """
     RUN_EVERY_MINS = 0
     schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
 
-    def is_running(self):
-        """Checks to see if an instance of this class is already running."""
-        try:
-            running = check_output(["pgrep", "-f", self.__class__.__name__]).decode("utf-8").strip().split("\n")
-            if len(running) > 2:
-                return True
-            else:
-                return False
-        except CalledProcessError:
-            return False
-
     def do(self):
-        if self.is_running():
+        holder = "{}:{}".format(socket.gethostname(), os.getpid())
+        if not acquire_lease(self.code, holder):
             return
+        heartbeat = LeaseHeartbeat(
+            partial(renew_lease, self.code, holder), settings.CRON_LEASE / 3, "{} held by {}".format(self.code, holder))
+        heartbeat.start()
+        try:
+            self.export()
+        finally:
+            heartbeat.stop()
+            release_lease(self.code, holder)
+
+    def export(self):
         start = datetime.now()
         source = [s[1] for s in FetchRun.SOURCE_CHOICES if s[0] == self.fetcher.source][0]
         print("Export of {} {} records from {} started at {}".format(
             self.object_status, self.object_type, source, start))
-        out = self.fetcher().fetch(self.object_status, self.object_type)
+        fetcher = self.fetcher()
+        out = fetcher.fetch(self.object_status, self.object_type, resume=True)
         end = datetime.now()
-        fetch_run = FetchRun.objects.filter(
-            status=FetchRun.FINISHED,
-            source=self.fetcher.source,
-            object_type=self.object_type,
-            object_status=self.object_status).order_by("-end_time")[0]
-        print("{} records exported in {}".format(out, end - start))
-        if fetch_run.error_count:
+        fetch_run = fetcher.current_run
+        if fetcher.skipped:
+            print("Nothing fetched while {} jobs queued by run {} are waiting to be processed".format(
+                fetch_run.fetchjob_set.filter(status__in=[FetchJob.QUEUED, FetchJob.CLAIMED]).count(), fetch_run.pk))
+        elif fetcher.queued:
+            print("{} jobs queued in {}".format(fetch_run.fetchjob_set.count(), end - start))
+        else:
+            print("{} records exported in {}".format(out, end - start))
+        if fetch_run.error_count and not fetcher.skipped:
             print("{} errors".format(fetch_run.error_count))
             for e in fetch_run.errors:
                 print("    {}".format(e.message))
@@ -45,12 +94,28 @@ class BaseCron(CronJobBase):
             self.object_status, self.object_type, source, end))
 
 
-class DeletedArchivesSpacePeople(BaseCron):
-    code = "fetcher.deleted_archivesspace_people"
+class DeletedArchivesSpaceObjects(BaseCron):
+    """Processes deleted ArchivesSpace objects of all types with a single pass
+    through the delete feed."""
+    code = "fetcher.deleted_archivesspace_objects"
     object_status = "deleted"
-    object_type = "agent_person"
+    object_types = [object_type for object_type, _ in FetchRun.ARCHIVESSPACE_OBJECT_TYPE_CHOICES]
     fetcher = ArchivesSpaceDataFetcher
 
+    def export(self):
+        start = datetime.now()
+        print("Export of deleted records from ArchivesSpace started at {}".format(start))
+        fetcher = self.fetcher()
+        out = fetcher.fetch_deleted(self.object_types)
+        end = datetime.now()
+        for object_type, fetch_run in fetcher.runs.items():
+            print("{} {} records exported".format(out[object_type], object_type))
+            if fetch_run.error_count:
+                print("{} errors".format(fetch_run.error_count))
+                for e in fetch_run.errors:
+                    print("    {}".format(e.message))
+        print("Export of deleted records from ArchivesSpace complete at {}\n".format(end))
+
 
 class UpdatedArchivesSpacePeople(BaseCron):
     code = "fetcher.updated_archivesspace_people"
@@ -59,13 +124,6 @@ class UpdatedArchivesSpacePeople(BaseCron):
     fetcher = ArchivesSpaceDataFetcher
 
 
-class DeletedArchivesSpaceOrganizations(BaseCron):
-    code = "fetcher.deleted_archivesspace_organizations"
-    object_status = "deleted"
-    object_type = "agent_corporate_entity"
-    fetcher = ArchivesSpaceDataFetcher
-
-
 class UpdatedArchivesSpaceOrganizations(BaseCron):
     code = "fetcher.updated_archivesspace_organizations"
     object_status = "updated"
@@ -73,13 +131,6 @@ class UpdatedArchivesSpaceOrganizations(BaseCron):
     fetcher = ArchivesSpaceDataFetcher
 
 
-class DeletedArchivesSpaceFamilies(BaseCron):
-    code = "fetcher.deleted_archivesspace_families"
-    object_status = "deleted"
-    object_type = "agent_family"
-    fetcher = ArchivesSpaceDataFetcher
-
-
 class UpdatedArchivesSpaceFamilies(BaseCron):
     code = "fetcher.updated_archivesspace_families"
     object_status = "updated"
@@ -87,13 +138,6 @@ class UpdatedArchivesSpaceFamilies(BaseCron):
     fetcher = ArchivesSpaceDataFetcher
 
 
-class DeletedArchivesSpaceSubjects(BaseCron):
-    code = "fetcher.deleted_archivesspace_subjects"
-    object_status = "deleted"
-    object_type = "subject"
-    fetcher = ArchivesSpaceDataFetcher
-
-
 class UpdatedArchivesSpaceSubjects(BaseCron):
     code = "fetcher.updated_archivesspace_subjects"
     object_status = "updated"
@@ -101,13 +145,6 @@ class UpdatedArchivesSpaceSubjects(BaseCron):
     fetcher = ArchivesSpaceDataFetcher
 
 
-class DeletedArchivesSpaceResources(BaseCron):
-    code = "fetcher.deleted_archivesspace_resources"
-    object_status = "deleted"
-    object_type = "resource"
-    fetcher = ArchivesSpaceDataFetcher
-
-
 class UpdatedArchivesSpaceResources(BaseCron):
     code = "fetcher.updated_archivesspace_resources"
     object_status = "updated"
@@ -115,13 +152,6 @@ class UpdatedArchivesSpaceResources(BaseCron):
     fetcher = ArchivesSpaceDataFetcher
 
 
-class DeletedArchivesSpaceArchivalObjects(BaseCron):
-    code = "fetcher.deleted_archivesspace_archival_objects"
-    object_status = "deleted"
-    object_type = "archival_object"
-    fetcher = ArchivesSpaceDataFetcher
-
-
 class UpdatedArchivesSpaceArchivalObjects(BaseCron):
     code = "fetcher.updated_archivesspace_archival_objects"
     object_status = "updated"
@@ -136,6 +166,45 @@ class UpdatedCartographerArrangementMapComponents(BaseCron):
     fetcher = CartographerDataFetcher
 
 
+class ProcessQueuedJobs(CronJobBase):
+    """Processes jobs queued by fetchers.
+
+    Any number of instances can run at once, on one or more hosts, since each
+    instance claims its own batches of jobs. Leases on claimed jobs are renewed
+    while they are processed, so they are not claimed again by another instance.
+    """
+    code = "fetcher.process_queued_jobs"
+    RUN_EVERY_MINS = 0
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    fetchers = {
+        FetchRun.ARCHIVESSPACE: ArchivesSpaceDataFetcher,
+        FetchRun.CARTOGRAPHER: CartographerDataFetcher,
+    }
+
+    def do(self):
+        worker = "{}:{}".format(socket.gethostname(), os.getpid())
+        start = datetime.now()
+        job_count = 0
+        processed = 0
+        while True:
+            jobs = claim_jobs(worker)
+            if not jobs:
+                break
+            job_count += len(jobs)
+            heartbeat = LeaseHeartbeat(
+                partial(renew_jobs, worker, jobs), settings.JOB_QUEUE["lease"] / 3, "jobs claimed by {}".format(worker))
+            heartbeat.start()
+            try:
+                for run_id, run_jobs in groupby(sorted(jobs, key=lambda j: j.run_id), key=lambda j: j.run_id):
+                    run = FetchRun.objects.get(pk=run_id)
+                    processed += self.fetchers[int(run.source)]().process_jobs(run, list(run_jobs))
+            finally:
+                heartbeat.stop()
+        if job_count:
+            print("{} records from {} jobs processed by {} in {}".format(
+                processed, job_count, worker, datetime.now() - start))
+
+
 class CleanUpCompleted(CronJobBase):
     code = "fetcher.cleanup_completed"
     RUN_EVERY_MINS = 0
@@ -1,31 +1,69 @@
 import asyncio
+import math
 from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from itertools import groupby
 
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
+from merger.helpers import RunCache, add_map_ancestors, arrangement_maps
 from merger.mergers import (AgentMerger, ArchivalObjectMerger,
                             ArrangementMapMerger, ResourceMerger,
                             SubjectMerger)
 from pisces import settings
+from transformer import pool as transform_pool
+from transformer.assets import asset_index, online_assets
 from transformer.transformers import Transformer
 
-from .helpers import (handle_deleted_uris, instantiate_aspace,
-                      instantiate_electronbond, last_run_time, list_chunks,
-                      send_error_notification)
-from .models import FetchRun, FetchRunError
+from .clients import (AsyncArchivesSpaceClient, AsyncAssetClient,
+                      AsyncCartographerClient, client_manager)
+from .helpers import (complete_job, fail_job, handle_deleted_uris,
+                      identifier_from_uri, last_run_time, list_chunks,
+                      queued_run, resumable_run, send_error_notification)
+from .models import FetchJob, FetchRun, FetchRunError
+from .resilience import aspace_upstream, cartographer_upstream
 
 
 class FetcherError(Exception):
     pass
 
 
-def run_transformer(merged_object_type, merged):
-    Transformer().run(merged_object_type, merged)
+def run_transformer(merged_object_type, merged, since=None, online=None):
+    """Transforms and saves merged data, and returns the seconds spent validating it."""
+    transformer = Transformer()
+    transformer.run(merged_object_type, merged, since, online)
+    return transformer.validation_time
 
 
-def run_merger(merger, object_type, fetched):
-    return merger(clients).merge(object_type, fetched)
+def save_transformed(transformed, online_pending, since=None):
+    Transformer().save_validated(transformed, online_pending, since)
+
+
+def run_merger(merger, object_type, fetched, cache=None):
+    return merger(client_manager.clients(), cache).merge(object_type, fetched)
+
+
+def fetch_resources(uris):
+    """Returns ArchivesSpace resources with resolved subjects and linked agents,
+    keyed by URI."""
+    client = client_manager.clients()["aspace"].client
+    resources = {}
+    for repository, repository_uris in groupby(sorted(set(uris)), key=lambda uri: uri.split("/resources/")[0]):
+        ids = [uri.split("/")[-1] for uri in repository_uris]
+        resp = client.get(
+            "{}/resources".format(repository),
+            params={"id_set": ids, "resolve": ["subjects", "linked_agents"]})
+        resp.raise_for_status()
+        for resource in resp.json():
+            resources[resource["uri"]] = resource
+    return resources
+
+
+def prepare_merger(merger, objects, cache=None):
+    merger(client_manager.clients(), cache).prepare(objects)
 
 
 class BaseDataFetcher:
@@ -34,97 +72,370 @@ class BaseDataFetcher:
     Provides a common run method inherited by other fetchers. Requires a source
     attribute to be set on inheriting fetchers.
     """
+    arrangement_map_object_types = ()
+
+    def fetch(self, object_status, object_type, resume=False):
+        """Fetches and processes data.
 
-    def fetch(self, object_status, object_type):
+        Args:
+            object_status (str): the status of objects to fetch, see FetchRun.OBJECT_STATUS_CHOICES.
+            object_type (str): the type of objects to fetch, see FetchRun.OBJECT_TYPE_CHOICES.
+            resume (bool): if True, an unfinished fetch is continued from its
+                last processed chunk rather than starting a new fetch.
+
+        If fetched data is queued as jobs, nothing is fetched while jobs queued
+        by a previous fetch are waiting to be processed, since that fetch is
+        not finished and the same objects would be queued again.
+        """
         self.object_status = object_status
         self.object_type = object_type
-        self.last_run = last_run_time(self.source, object_status, object_type)
-        global clients
         self.processed = 0
-        self.current_run = FetchRun.objects.create(
-            status=FetchRun.STARTED,
-            source=self.source,
-            object_type=object_type,
-            object_status=object_status)
+        self.queued = False
+        self.skipped = False
+        if object_status == "updated" and settings.JOB_QUEUE["queue_use"]:
+            pending = queued_run(self.source, object_status, object_type)
+            if pending:
+                self.current_run = pending
+                self.queued = self.skipped = True
+                return self.processed
+        self.last_run = last_run_time(self.source, object_status, object_type)
+        self.validation_time = 0
+        self.current_run = resumable_run(self.source, object_status, object_type) if resume else None
+        if self.current_run:
+            self.current_run.status = FetchRun.STARTED
+            self.current_run.save()
+        else:
+            self.current_run = FetchRun.objects.create(
+                status=FetchRun.STARTED,
+                source=self.source,
+                object_type=object_type,
+                object_status=object_status)
+        self.completed_chunks = set()
         self.merger = self.get_merger(object_type)
+        self.cache = RunCache(settings.RUN_CACHE_SIZE)
 
         try:
-            clients = self.instantiate_clients()
-            fetched = getattr(
-                self, "get_{}".format(self.object_status))()
-            asyncio.get_event_loop().run_until_complete(
-                self.process_fetched(fetched))
+            self.clients = self.instantiate_clients()
+            asset_index.refresh()
+            async_to_sync(self.fetch_and_process)()
         except Exception as e:
             self.current_run.status = FetchRun.ERRORED
             self.current_run.end_time = timezone.now()
-            self.current_run.save()
+            self.current_run.save(update_fields=["status", "end_time"])
             FetchRunError.objects.create(
                 run=self.current_run,
                 message="Error fetching data: {}".format(e),
             )
             raise FetcherError(e)
 
+        if self.queued:
+            return self.processed
         self.current_run.status = FetchRun.FINISHED
         self.current_run.end_time = timezone.now()
+        self.current_run.fetched = None
+        self.current_run.processed = self.processed
+        self.current_run.cache_hits = self.cache.hits
+        self.current_run.cache_misses = self.cache.misses
+        self.current_run.validation_time = self.validation_time
         self.current_run.save()
         if self.current_run.error_count > 0:
             send_error_notification(self.current_run)
         return self.processed
 
     def instantiate_clients(self):
-        clients = {
-            "aspace": instantiate_aspace(settings.ARCHIVESSPACE)
-        }
-        if settings.CARTOGRAPHER['cartographer_use']:
-            clients["cartographer"] = instantiate_electronbond(settings.CARTOGRAPHER)
-        return clients
+        """Returns clients for the current thread."""
+        return client_manager.clients()
+
+    def refresh_arrangement_maps(self):
+        """Refreshes the snapshot of Cartographer arrangement maps used by mergers.
+
+        Only called once there are records to merge. If the snapshot cannot be
+        loaded, mergers request arrangement map components from Cartographer as
+        they need them.
+        """
+        if self.object_status == "updated" and self.object_type in self.arrangement_map_object_types and "cartographer" in self.clients:
+            try:
+                arrangement_maps.refresh(self.clients["cartographer"])
+            except Exception as e:
+                print(e)
+                arrangement_maps.invalidate()
+
+    async def fetch_and_process(self):
+        """Fetches and processes data using an asynchronous client, which is
+        available to other methods as `self.async_client`."""
+        self.asset_lookups = {}
+        async with self.get_async_client() as self.async_client, AsyncAssetClient(settings.ASSET_BASEURL) as self.asset_client:
+            if self.current_run.fetched is not None:
+                fetched = self.current_run.fetched
+            else:
+                fetched = await getattr(
+                    self, "get_{}".format(self.object_status))()
+                if self.object_status == "updated":
+                    await self.save_fetched(fetched)
+            if self.object_status == "updated" and settings.JOB_QUEUE["queue_use"]:
+                await self.enqueue_fetched(fetched)
+            else:
+                if len(fetched):
+                    await sync_to_async(self.refresh_arrangement_maps, thread_sensitive=True)()
+                await self.process_fetched(fetched)
+
+    async def save_fetched(self, fetched):
+        """Saves fetched data to the current run so that it can be resumed."""
+        await sync_to_async(
+            FetchRun.objects.filter(pk=self.current_run.pk).update,
+            thread_sensitive=True)(fetched=list(fetched))
+
+    async def enqueue_fetched(self, fetched):
+        """Queues fetched data as jobs to be processed by workers.
+
+        Each job is a page of identifiers or a single item. Once jobs have been
+        created the run can no longer be resumed, and is finished by the worker
+        which processes its last job.
+        """
+        start = self.current_run.processed_chunks
+        if self.source == FetchRun.ARCHIVESSPACE:
+            chunks = (list(chunk) for chunk in list_chunks(fetched, self.page_size, start))
+        else:
+            chunks = fetched[start:]
+        jobs = [FetchJob(run=self.current_run, index=index, data=data) for index, data in enumerate(chunks, start)]
+        if jobs:
+            await sync_to_async(self.save_jobs, thread_sensitive=True)(jobs)
+            self.queued = True
+
+    def save_jobs(self, jobs):
+        with transaction.atomic():
+            FetchJob.objects.bulk_create(jobs, batch_size=1000)
+            FetchRun.objects.filter(pk=self.current_run.pk).update(fetched=None)
+
+    def process_jobs(self, run, jobs):
+        """Processes queued jobs belonging to a run.
+
+        Args:
+            run (FetchRun): the run which created the jobs.
+            jobs (list): FetchJob objects claimed by the current worker.
+        """
+        self.object_status = run.object_status
+        self.object_type = run.object_type
+        self.current_run = run
+        self.processed = 0
+        self.validation_time = 0
+        self.merger = self.get_merger(run.object_type)
+        self.cache = RunCache(settings.RUN_CACHE_SIZE)
+        self.clients = self.instantiate_clients()
+        self.refresh_arrangement_maps()
+        asset_index.refresh()
+        async_to_sync(self.fetch_and_process_jobs)(jobs)
+        FetchRun.objects.filter(pk=run.pk).update(
+            cache_hits=F("cache_hits") + self.cache.hits,
+            cache_misses=F("cache_misses") + self.cache.misses,
+            validation_time=F("validation_time") + self.validation_time)
+        return self.processed
+
+    async def fetch_and_process_jobs(self, jobs):
+        to_delete = []
+        loop = asyncio.get_event_loop()
+        executor = ThreadPoolExecutor()
+        handler = self.handle_page if self.source == FetchRun.ARCHIVESSPACE else self.handle_item
+        self.asset_lookups = {}
+        async with self.get_async_client() as self.async_client, AsyncAssetClient(settings.ASSET_BASEURL) as self.asset_client:
+            await asyncio.gather(*[self.handle_job(job, handler, loop, executor, to_delete) for job in jobs])
+        await asyncio.gather(
+            handle_deleted_uris(to_delete, self.source, self.object_type, self.current_run),
+            return_exceptions=True)
+
+    async def handle_job(self, job, handler, *args):
+        """Handles a job, returning it to the queue if it fails."""
+        try:
+            await handler(job.data, *args)
+        except Exception as e:
+            print(e)
+            await sync_to_async(fail_job, thread_sensitive=True)(job, e)
+        else:
+            processed = len(job.data) if isinstance(job.data, list) else 1
+            await sync_to_async(complete_job, thread_sensitive=True)(job, processed)
 
     async def process_fetched(self, fetched):
-        tasks = []
+        """Processes fetched data.
+
+        Updated data is fetched and handled by a fixed number of workers, which
+        take pages or items from a bounded queue. This keeps memory usage flat
+        regardless of how many objects have changed.
+        """
         to_delete = []
         loop = asyncio.get_event_loop()
         executor = ThreadPoolExecutor()
+        start = self.current_run.processed_chunks
         if self.object_status == "updated":
             if self.source == FetchRun.ARCHIVESSPACE:
-                semaphore = asyncio.BoundedSemaphore(settings.CHUNK_SIZE / self.page_size)
-                for id_chunk in list_chunks(fetched, self.page_size):
-                    task = asyncio.ensure_future(self.handle_page(id_chunk, loop, executor, semaphore, to_delete))
-                    tasks.append(task)
+                await self.run_workers(
+                    enumerate(list_chunks(fetched, self.page_size, start), start),
+                    math.ceil(len(fetched) / self.page_size) - start,
+                    settings.ARCHIVESSPACE["concurrency_max"],
+                    self.handle_page, loop, executor, to_delete)
             else:
-                semaphore = asyncio.BoundedSemaphore(settings.CHUNK_SIZE)
-                for obj in fetched:
-                    task = asyncio.ensure_future(self.handle_item(obj, loop, executor, semaphore, to_delete))
-                    tasks.append(task)
+                await self.run_workers(
+                    enumerate(fetched[start:], start),
+                    len(fetched) - start,
+                    settings.CARTOGRAPHER["concurrency"],
+                    self.handle_item, loop, executor, to_delete)
         else:
             to_delete = fetched
             self.processed = len(fetched)
-        tasks.append(asyncio.ensure_future(handle_deleted_uris(to_delete, self.source, self.object_type, self.current_run)))
-        await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def handle_page(self, id_list, loop, executor, semaphore, to_delete):
-        async with semaphore:
-            page = await self.get_page(id_list)
+        await asyncio.gather(
+            handle_deleted_uris(to_delete, self.source, self.object_type, self.current_run),
+            return_exceptions=True)
+
+    async def run_workers(self, work, work_count, concurrency, handler, *args):
+        """Runs a handler over each piece of work using a pool of workers.
+
+        Args:
+            work (iterable): tuples of a chunk index and a page or item to be handled.
+            work_count (int): number of pages or items in work.
+            concurrency (int): maximum number of workers.
+            handler (coroutine function): called with each piece of work and args.
+        """
+        worker_count = max(1, min(concurrency, work_count))
+        queue = asyncio.Queue(maxsize=worker_count * 2)
+        workers = [asyncio.ensure_future(self.worker(queue, handler, *args)) for _ in range(worker_count)]
+        for piece in work:
+            await queue.put(piece)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    async def worker(self, queue, handler, *args):
+        """Handles work from a queue until a None value is received."""
+        while True:
+            piece = await queue.get()
+            if piece is None:
+                return
+            index, data = piece
+            try:
+                await handler(data, *args)
+            except Exception as e:
+                print(e)
+                await sync_to_async(FetchRunError.objects.create, thread_sensitive=True)(
+                    run=self.current_run, message="Error fetching data: {}".format(e))
+            await self.checkpoint(index)
+
+    async def checkpoint(self, index):
+        """Marks a chunk as processed.
+
+        Chunks may complete out of order, so the current run only records the
+        number of chunks which have been processed without any gaps.
+        """
+        self.completed_chunks.add(index)
+        processed = self.current_run.processed_chunks
+        while processed in self.completed_chunks:
+            self.completed_chunks.remove(processed)
+            processed += 1
+        if processed != self.current_run.processed_chunks:
+            self.current_run.processed_chunks = processed
+            await sync_to_async(
+                FetchRun.objects.filter(pk=self.current_run.pk).update,
+                thread_sensitive=True)(processed_chunks=processed)
+
+    async def handle_page(self, id_list, loop, executor, to_delete):
+        page = await self.get_page(id_list)
+        if settings.ASSET_LOOKUP_ASYNC:
             for obj in page:
-                await self.handle_data(obj, loop, executor, semaphore, to_delete)
-                self.processed += 1
-
-    async def handle_item(self, identifier, loop, executor, semaphore, to_delete):
-        async with semaphore:
-            item = await self.get_item(identifier)
-            await self.handle_data(item, loop, executor, semaphore, to_delete)
+                if self.is_exportable(obj):
+                    self.get_online_lookup(obj)
+        await self.prepare_page(page, loop, executor)
+        for obj in page:
+            await self.handle_data(obj, loop, executor, to_delete)
             self.processed += 1
 
-    async def handle_data(self, data, loop, executor, semaphore, to_delete):
+    async def prepare_page(self, page, loop, executor):
+        """Looks up data shared by a page of archival objects in bulk.
+
+        Errors are not recorded here, since each object falls back to looking
+        up its own data when it is merged.
+        """
+        objects = [obj for obj in page if obj.get("jsonmodel_type") == "archival_object" and self.is_exportable(obj)]
+        if objects:
+            try:
+                await loop.run_in_executor(executor, prepare_merger, self.merger, objects, self.cache)
+            except Exception as e:
+                print(e)
+
+    async def handle_item(self, identifier, loop, executor, to_delete):
+        item = await self.get_item(identifier)
+        await self.handle_data(item, loop, executor, to_delete)
+        self.processed += 1
+
+    async def handle_data(self, data, loop, executor, to_delete):
         try:
             if self.is_exportable(data):
-                merged, merged_object_type = await loop.run_in_executor(executor, run_merger, self.merger, self.object_type, data)
-                await loop.run_in_executor(executor, run_transformer, merged_object_type, merged)
+                merged, merged_object_type = await loop.run_in_executor(executor, run_merger, self.merger, self.object_type, data, self.cache)
+                await self.transform(merged_object_type, merged, loop, executor)
             else:
                 to_delete.append(data.get("uri", data.get("archivesspace_uri")))
         except Exception as e:
             print(e)
             await sync_to_async(FetchRunError.objects.create, thread_sensitive=True)(run=self.current_run, message=str(e))
 
+    async def transform(self, merged_object_type, merged, loop, executor):
+        """Transforms and saves merged data.
+
+        If TRANSFORM_PROCESSES is set, data is transformed in a pool of worker
+        processes and the result is saved in a thread, otherwise both happen in
+        a thread. If ASSET_LOOKUP_ASYNC is set, whether archival objects have
+        an online asset is looked up before they are transformed.
+        """
+        online = None
+        if settings.ASSET_LOOKUP_ASYNC and merged_object_type in ["archival_object", "archival_object_collection"]:
+            online = await self.get_online(merged)
+        if settings.TRANSFORM_PROCESSES:
+            transformed, online_pending, validation_time = await loop.run_in_executor(
+                transform_pool.get_executor(settings.TRANSFORM_PROCESSES),
+                transform_pool.transform, merged_object_type, merged, online)
+            await loop.run_in_executor(executor, save_transformed, transformed, online_pending, self.current_run.start_time)
+        else:
+            validation_time = await loop.run_in_executor(
+                executor, run_transformer, merged_object_type, merged, self.current_run.start_time, online)
+        self.validation_time += validation_time
+
+    async def get_online(self, data):
+        """Returns True if data has digital object instances with an online asset."""
+        lookup = self.get_online_lookup(data)
+        return await lookup if lookup else False
+
+    def get_online_lookup(self, data):
+        """Starts looking up the online asset for data with digital object instances.
+
+        Assets are looked up in the asset manifest if one is loaded, otherwise
+        they are requested concurrently while other data is merged. Each
+        identifier is looked up once during a run, and results are cached
+        between runs.
+
+        Returns:
+            asyncio.Future: resolves to True if an asset is available, or None
+                if data has no digital object instances.
+        """
+        if not [i for i in data.get("instances", []) if i.get("instance_type") == "digital_object"]:
+            return None
+        identifier = identifier_from_uri(data["uri"])
+        lookup = self.asset_lookups.get(identifier)
+        if not lookup:
+            lookup = asyncio.ensure_future(self.lookup_asset(identifier))
+            lookup.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.asset_lookups[identifier] = lookup
+        return lookup
+
+    async def lookup_asset(self, identifier):
+        available = asset_index.get(identifier)
+        if available is None:
+            available = online_assets.get(identifier)
+        if available is None:
+            try:
+                available = await self.asset_client.has_asset(identifier)
+            except Exception:
+                del self.asset_lookups[identifier]
+                raise
+            online_assets.set(identifier, available)
+        return available
+
     def is_exportable(self, obj):
         """Determines whether the object can be exported.
 
@@ -145,6 +456,7 @@ class ArchivesSpaceDataFetcher(BaseDataFetcher):
     """Fetches updated and deleted data from ArchivesSpace."""
     source = FetchRun.ARCHIVESSPACE
     page_size = 25
+    arrangement_map_object_types = ("archival_object", "resource")
 
     def get_merger(self, object_type):
         MERGERS = {
@@ -157,18 +469,86 @@ class ArchivesSpaceDataFetcher(BaseDataFetcher):
         }
         return MERGERS[object_type]
 
-    def get_updated(self):
+    def get_async_client(self):
+        """Returns an asynchronous client which reuses the existing ArchivesSpace
+        session."""
+        return AsyncArchivesSpaceClient(
+            settings.ARCHIVESSPACE["baseurl"],
+            settings.ARCHIVESSPACE["username"],
+            settings.ARCHIVESSPACE["password"],
+            session_token=self.clients["aspace"].client.session.headers.get("X-ArchivesSpace-Session"),
+            upstream=aspace_upstream,
+            record_cache_size=settings.RUN_CACHE_SIZE)
+
+    async def get_updated(self):
         params = {"all_ids": True, "modified_since": self.last_run}
         endpoint = self.get_endpoint(self.object_type)
-        return clients["aspace"].client.get(endpoint, params=params).json()
+        return await self.async_client.get_id_list(endpoint, params=params)
 
-    def get_deleted(self):
-        data = []
-        for d in clients["aspace"].client.get_paged(
+    async def get_deleted(self):
+        return (await self.get_delete_feed())[self.object_type]
+
+    async def get_delete_feed(self):
+        """Returns URIs from the delete feed since the last run, grouped by object type."""
+        deleted = {object_type: [] for object_type, _ in FetchRun.ARCHIVESSPACE_OBJECT_TYPE_CHOICES}
+        endpoints = {object_type: self.get_endpoint(object_type) for object_type in deleted}
+        async for d in self.async_client.get_paged(
                 "delete-feed", params={"modified_since": self.last_run}):
-            if self.get_endpoint(self.object_type) in d:
-                data.append(d)
-        return data
+            for object_type, endpoint in endpoints.items():
+                if endpoint in d:
+                    deleted[object_type].append(d)
+        return deleted
+
+    def fetch_deleted(self, object_types):
+        """Fetches and processes deleted data for several object types.
+
+        The delete feed is read once, starting from the earliest last run time
+        of the object types. A FetchRun is created for each object type, so the
+        last run time of each object type is still tracked separately.
+
+        Args:
+            object_types (list): object types to fetch, see FetchRun.ARCHIVESSPACE_OBJECT_TYPE_CHOICES.
+
+        Returns:
+            dict: the number of deleted objects processed for each object type.
+        """
+        self.object_status = "deleted"
+        self.last_run = min(last_run_time(self.source, self.object_status, object_type) for object_type in object_types)
+        self.runs = {object_type: FetchRun.objects.create(
+            status=FetchRun.STARTED,
+            source=self.source,
+            object_type=object_type,
+            object_status=self.object_status) for object_type in object_types}
+
+        try:
+            self.clients = self.instantiate_clients()
+            deleted = async_to_sync(self.fetch_and_process_deleted)()
+        except Exception as e:
+            for run in self.runs.values():
+                run.status = FetchRun.ERRORED
+                run.end_time = timezone.now()
+                run.save(update_fields=["status", "end_time"])
+                FetchRunError.objects.create(run=run, message="Error fetching data: {}".format(e))
+            raise FetcherError(e)
+
+        processed = {}
+        for object_type, run in self.runs.items():
+            processed[object_type] = len(deleted[object_type])
+            run.status = FetchRun.FINISHED
+            run.end_time = timezone.now()
+            run.processed = processed[object_type]
+            run.save()
+            if run.error_count > 0:
+                send_error_notification(run)
+        return processed
+
+    async def fetch_and_process_deleted(self):
+        async with self.get_async_client() as self.async_client:
+            deleted = await self.get_delete_feed()
+        await asyncio.gather(
+            *[handle_deleted_uris(deleted[object_type], self.source, object_type, run) for object_type, run in self.runs.items()],
+            return_exceptions=True)
+        return deleted
 
     def get_endpoint(self, object_type):
         repo_baseurl = "/repositories/{}".format(settings.ARCHIVESSPACE["repo"])
@@ -188,34 +568,93 @@ class ArchivesSpaceDataFetcher(BaseDataFetcher):
         return endpoint
 
     async def get_page(self, id_list):
+        if settings.ARCHIVESSPACE["reference_cache"]:
+            page = await self.async_client.get(self.get_endpoint(self.object_type), params={"id_set": list(id_list)})
+            await self.resolve_references(page)
+            return page
         params = {
-            "id_set": id_list,
+            "id_set": list(id_list),
             "resolve": ["ancestors", "ancestors::linked_agents", "instances::top_container", "linked_agents", "subjects"]}
-        return clients["aspace"].client.get(self.get_endpoint(self.object_type), params=params).json()
+        return await self.async_client.get(self.get_endpoint(self.object_type), params=params)
+
+    async def resolve_references(self, page):
+        """Adds resolved records to the references in a page of objects.
+
+        Each referenced record is requested once per run, rather than being
+        embedded in every page which refers to it. Ancestors are requested with
+        their linked agents resolved.
+        """
+        references = []
+        for obj in page:
+            references += [(ancestor, {"resolve": ["linked_agents"]}) for ancestor in obj.get("ancestors", [])]
+            references += [(reference, None) for key in ["linked_agents", "subjects"] for reference in obj.get(key, [])]
+            references += [(instance["sub_container"]["top_container"], None) for instance in obj.get("instances", [])
+                           if instance.get("sub_container", {}).get("top_container")]
+        records = await asyncio.gather(*[self.async_client.get_record(reference["ref"], params) for reference, params in references])
+        for (reference, _), record in zip(references, records):
+            reference["_resolved"] = deepcopy(record)
 
 
 class CartographerDataFetcher(BaseDataFetcher):
     """Fetches updated and deleted data from Cartographer."""
     source = FetchRun.CARTOGRAPHER
     base_endpoint = "/api/components/"
+    resource_page_size = 25
+    map_components = None
 
     def get_merger(self, object_type):
         return ArrangementMapMerger
 
-    def get_updated(self):
+    def get_async_client(self):
+        return AsyncCartographerClient(settings.CARTOGRAPHER["baseurl"], upstream=cartographer_upstream)
+
+    async def get_updated(self):
         data = []
-        for obj in clients["cartographer"].get(
-                self.base_endpoint, params={"modified_since": self.last_run}).json()['results']:
+        resp = await self.async_client.get(
+            self.base_endpoint, params={"modified_since": self.last_run})
+        for obj in resp['results']:
             data.append("{}{}/".format(self.base_endpoint, obj.get("id")))
+        if data and settings.CARTOGRAPHER["map_merge"]:
+            data = await self.get_map_components(data)
         return data
 
-    def get_deleted(self):
+    async def get_map_components(self, updated):
+        """Returns every component in the arrangement maps which contain updated components.
+
+        Only those arrangement maps are loaded, by following the ancestors and
+        children of updated components until every component in each map has
+        been requested once. Ancestors are worked out from the components in
+        each map, and the resources linked to the components are fetched in
+        pages, so that each component can be merged without further requests.
+        """
+        loop = asyncio.get_event_loop()
+        components = {}
+        refs = updated
+        while refs:
+            loaded = await asyncio.gather(*[self.async_client.get(ref) for ref in refs])
+            components.update((component["ref"], component) for component in loaded)
+            refs = sorted(set(
+                reference["ref"] for component in loaded
+                for reference in component["ancestors"] + component["children"]) - set(components))
+        self.map_components = {component["ref"]: component for component in add_map_ancestors(list(components.values()))}
+        pages = await asyncio.gather(*[
+            loop.run_in_executor(None, fetch_resources, uris)
+            for uris in list_chunks([c["archivesspace_uri"] for c in self.map_components.values()], self.resource_page_size)])
+        resources = {uri: resource for page in pages for uri, resource in page.items()}
+        for component in self.map_components.values():
+            component["_resolved"] = resources.get(component["archivesspace_uri"])
+        return sorted(set(updated) | set(self.map_components))
+
+    async def get_deleted(self):
         data = []
-        for deleted_ref in clients["cartographer"].get(
-                '/api/delete-feed/', params={"deleted_since": self.last_run}).json()['results']:
+        resp = await self.async_client.get(
+            '/api/delete-feed/', params={"deleted_since": self.last_run})
+        for deleted_ref in resp['results']:
             if self.base_endpoint in deleted_ref['ref']:
                 data.append(deleted_ref.get('archivesspace_uri'))
         return data
 
     async def get_item(self, obj_ref):
-        return clients["cartographer"].get(obj_ref).json()
+        if self.map_components and obj_ref in self.map_components:
+            return deepcopy(self.map_components[obj_ref])
+        return await self.async_client.get(obj_ref)
@@ -1,21 +1,29 @@
+from datetime import timedelta
+
 import requests
 import shortuuid
+from asgiref.sync import sync_to_async
 from asnake.aspace import ASpace
 from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from electronbonder.client import ElectronBond
 
 from pisces import settings
+from transformer.positions import remove_positions
 
-from .models import FetchRun
+from .models import CronLease, FetchJob, FetchRun, FetchRunError
 
 
-def list_chunks(lst, n):
+def list_chunks(lst, n, start=0):
     """Yield successive n-sized chunks from list.
     Args:
         lst (list): list to chunkify
         n (integer): size of chunk to produce
+        start (integer): index of the first chunk to produce
     """
-    for i in range(0, len(lst), n):
+    for i in range(start * n, len(lst), n):
         yield lst[i:i + n]
 
 
@@ -45,6 +53,174 @@ def last_run_time(source, object_status, object_type):
         return 0
 
 
+def resumable_run(source, object_status, object_type):
+    """Returns the most recent unfinished fetch which can be resumed.
+
+    Only fetches which have saved their fetched data and started after the
+    last successful fetch can be resumed.
+
+    Args:
+        source (int): a data source, see FetchRun.SOURCE_CHOICES
+        object_status (int): the process status, see FetchRun.STATUS_CHOICES
+        object_type (str): an object type that was fetched, see FetchRun.OBJECT_TYPE_CHOICES
+
+    Returns:
+        FetchRun: a resumable FetchRun, or None.
+    """
+    runs = FetchRun.objects.filter(
+        source=source,
+        object_type=object_type,
+        object_status=object_status)
+    last_finished = runs.filter(status=FetchRun.FINISHED).order_by("-start_time").first()
+    resumable = runs.filter(
+        status__in=[FetchRun.STARTED, FetchRun.ERRORED],
+        fetched__isnull=False)
+    if last_finished:
+        resumable = resumable.filter(start_time__gt=last_finished.start_time)
+    return resumable.order_by("-start_time").first()
+
+
+def queued_run(source, object_status, object_type):
+    """Returns the most recent fetch whose queued jobs are still waiting to be
+    processed.
+
+    Args:
+        source (int): a data source, see FetchRun.SOURCE_CHOICES
+        object_status (int): the process status, see FetchRun.STATUS_CHOICES
+        object_type (str): an object type that was fetched, see FetchRun.OBJECT_TYPE_CHOICES
+
+    Returns:
+        FetchRun: a FetchRun with queued or claimed jobs, or None.
+    """
+    return FetchRun.objects.filter(
+        source=source,
+        object_type=object_type,
+        object_status=object_status,
+        status=FetchRun.STARTED,
+        fetchjob__status__in=[FetchJob.QUEUED, FetchJob.CLAIMED]).order_by("-start_time").first()
+
+
+def acquire_lease(code, holder):
+    """Acquires the lease for a cron job if it is not held or has expired.
+
+    Args:
+        code (str): the code of the cron job.
+        holder (str): an identifier for the process acquiring the lease.
+
+    Returns:
+        bool: True if the lease was acquired.
+    """
+    now = timezone.now()
+    expires = now + timedelta(seconds=settings.CRON_LEASE)
+    if CronLease.objects.filter(code=code, expires__lt=now).update(holder=holder, expires=expires):
+        return True
+    try:
+        with transaction.atomic():
+            CronLease.objects.create(code=code, holder=holder, expires=expires)
+        return True
+    except IntegrityError:
+        return False
+
+
+def renew_lease(code, holder):
+    """Extends a lease, returning False if it is no longer held by the holder."""
+    return bool(CronLease.objects.filter(code=code, holder=holder).update(
+        expires=timezone.now() + timedelta(seconds=settings.CRON_LEASE)))
+
+
+def release_lease(code, holder):
+    CronLease.objects.filter(code=code, holder=holder).delete()
+
+
+def claim_jobs(worker):
+    """Claims a batch of queued jobs for a worker.
+
+    Jobs are claimed by giving them a lease, during which other workers cannot
+    claim them. Jobs locked by other workers are skipped rather than waited for.
+    Jobs whose lease has expired without being finished are claimed again, or
+    marked as errored if they have no attempts remaining.
+
+    Args:
+        worker (str): an identifier for the worker claiming jobs.
+
+    Returns:
+        list: FetchJob objects claimed by the worker.
+    """
+    config = settings.JOB_QUEUE
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(FetchJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=FetchJob.QUEUED) | Q(status=FetchJob.CLAIMED, lease_expires__lt=now)
+        ).order_by("id")[:config["claim_size"]])
+        claimed = [job for job in jobs if job.attempts < config["max_attempts"]]
+        expired = [job for job in jobs if job.attempts >= config["max_attempts"]]
+        FetchJob.objects.filter(pk__in=[job.pk for job in claimed]).update(
+            status=FetchJob.CLAIMED,
+            worker=worker,
+            lease_expires=now + timedelta(seconds=config["lease"]),
+            attempts=F("attempts") + 1)
+        FetchJob.objects.filter(pk__in=[job.pk for job in expired]).update(status=FetchJob.ERRORED)
+        FetchRunError.objects.bulk_create([
+            FetchRunError(run_id=job.run_id, message="Error fetching data: job {} was not finished after {} attempts".format(job.index, job.attempts))
+            for job in expired])
+    for job in claimed:
+        job.attempts += 1
+        job.worker = worker
+    for run_id in set(job.run_id for job in expired):
+        finish_run(run_id)
+    return claimed
+
+
+def renew_jobs(worker, jobs):
+    """Extends the leases of jobs which are still claimed by a worker.
+
+    Returns:
+        int: the number of leases extended.
+    """
+    return FetchJob.objects.filter(pk__in=[job.pk for job in jobs], worker=worker, status=FetchJob.CLAIMED).update(
+        lease_expires=timezone.now() + timedelta(seconds=settings.JOB_QUEUE["lease"]))
+
+
+def claimed_job(job):
+    """Returns a queryset matching a job only while it is claimed by the worker which claimed it."""
+    return FetchJob.objects.filter(pk=job.pk, worker=job.worker, status=FetchJob.CLAIMED)
+
+
+def complete_job(job, processed):
+    """Marks a job as finished and adds the records it processed to its run.
+
+    Nothing is changed if the job has been claimed by another worker since its
+    lease expired, so that its records are only counted once.
+    """
+    if claimed_job(job).update(status=FetchJob.FINISHED, lease_expires=None):
+        FetchRun.objects.filter(pk=job.run_id).update(processed=F("processed") + processed)
+        finish_run(job.run_id)
+
+
+def fail_job(job, error):
+    """Returns a job to the queue, or marks it as errored if it has no attempts remaining.
+
+    Nothing is changed if the job has been claimed by another worker since its
+    lease expired.
+    """
+    if job.attempts < settings.JOB_QUEUE["max_attempts"]:
+        claimed_job(job).update(status=FetchJob.QUEUED, lease_expires=None)
+    elif claimed_job(job).update(status=FetchJob.ERRORED, lease_expires=None):
+        FetchRunError.objects.create(run_id=job.run_id, message="Error fetching data: {}".format(error))
+        finish_run(job.run_id)
+
+
+def finish_run(run_id):
+    """Marks a run as finished once none of its jobs are waiting to be processed."""
+    if FetchJob.objects.filter(run_id=run_id, status__in=[FetchJob.QUEUED, FetchJob.CLAIMED]).exists():
+        return
+    if FetchRun.objects.filter(pk=run_id, status=FetchRun.STARTED).update(
+            status=FetchRun.FINISHED, end_time=timezone.now()):
+        fetch_run = FetchRun.objects.get(pk=run_id)
+        if fetch_run.error_count > 0:
+            send_error_notification(fetch_run)
+
+
 def instantiate_aspace(self, config=None):
     """Instantiates and returns an ASpace object with a repository as an attribute.
 
@@ -107,6 +283,8 @@ async def handle_deleted_uris(uri_list, source, object_type, current_run):
             raise Exception("Error sending delete request: {}".format(resp.json()["detail"]))
         except Exception as e:
             raise Exception("Error sending delete request: {}".format(e))
+        if settings.SHIFT_POSITIONS:
+            await sync_to_async(remove_positions, thread_sensitive=True)(es_ids, current_run.start_time)
     return updated
 
 
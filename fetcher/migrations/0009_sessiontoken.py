@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0008_alter_user_first_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('baseurl', models.CharField(max_length=255)),
+                ('username', models.CharField(max_length=255)),
+                ('token', models.CharField(max_length=255)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+    ]
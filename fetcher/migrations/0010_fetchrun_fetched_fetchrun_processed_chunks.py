@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0009_sessiontoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='fetched',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fetchrun',
+            name='processed_chunks',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0010_fetchrun_fetched_fetchrun_processed_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FetchJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('data', models.JSONField()),
+                ('status', models.IntegerField(choices=[(0, 'Queued'), (1, 'Claimed'), (2, 'Finished'), (3, 'Errored')], default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fetcher.fetchrun')),
+            ],
+            options={
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['status', 'lease_expires'], name='fetcher_fet_status_5915bf_idx')],
+            },
+        ),
+    ]
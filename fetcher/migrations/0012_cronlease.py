@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0011_fetchrun_processed_fetchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CronLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=255, unique=True)),
+                ('holder', models.CharField(max_length=255)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0012_cronlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='cache_hits',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fetchrun',
+            name='cache_misses',
+            field=models.IntegerField(default=0),
+        ),
+    ]
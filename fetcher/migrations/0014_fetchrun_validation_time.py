@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0013_fetchrun_cache_hits_fetchrun_cache_misses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='validation_time',
+            field=models.FloatField(default=0),
+        ),
+    ]
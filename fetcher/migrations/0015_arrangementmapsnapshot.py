@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fetcher', '0014_fetchrun_validation_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArrangementMapSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('baseurl', models.CharField(max_length=255, unique=True)),
+                ('components', models.JSONField()),
+                ('loaded', models.IntegerField()),
+            ],
+        ),
+    ]
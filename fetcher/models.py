@@ -40,6 +40,12 @@ class FetchRun(models.Model):
     source = models.CharField(max_length=100, choices=SOURCE_CHOICES)
     object_type = models.CharField(max_length=100, choices=OBJECT_TYPE_CHOICES)
     object_status = models.CharField(max_length=100, choices=OBJECT_STATUS_CHOICES)
+    fetched = models.JSONField(blank=True, null=True)
+    processed_chunks = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    cache_hits = models.IntegerField(default=0)
+    cache_misses = models.IntegerField(default=0)
+    validation_time = models.FloatField(default=0)
 
     @property
     def errors(self):
@@ -49,6 +55,10 @@ class FetchRun(models.Model):
     def error_count(self):
         return len(FetchRunError.objects.filter(run=self))
 
+    @property
+    def job_counts(self):
+        return {label: FetchJob.objects.filter(run=self, status=status).count() for status, label in FetchJob.STATUS_CHOICES}
+
     @property
     def elapsed(self):
         if (self.end_time and self.end_time):
@@ -63,3 +73,59 @@ class FetchRunError(models.Model):
 
     class Meta:
         ordering = ('datetime', )
+
+
+class FetchJob(models.Model):
+    """A page or item of fetched data which is queued to be processed by a worker."""
+    QUEUED = 0
+    CLAIMED = 1
+    FINISHED = 2
+    ERRORED = 3
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (CLAIMED, 'Claimed'),
+        (FINISHED, 'Finished'),
+        (ERRORED, 'Errored'),
+    )
+    run = models.ForeignKey(FetchRun, on_delete=models.CASCADE)
+    index = models.IntegerField()
+    data = models.JSONField()
+    status = models.IntegerField(choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expires = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "lease_expires"])]
+        ordering = ('id', )
+
+
+class CronLease(models.Model):
+    """A lease held by a process while it runs a cron job.
+
+    Leases which are not renewed before they expire can be taken over by
+    another process.
+    """
+    code = models.CharField(max_length=255, unique=True)
+    holder = models.CharField(max_length=255)
+    expires = models.DateTimeField()
+
+
+class SessionToken(models.Model):
+    """An ArchivesSpace session token which can be shared between processes."""
+    baseurl = models.CharField(max_length=255)
+    username = models.CharField(max_length=255)
+    token = models.CharField(max_length=255)
+    expires = models.DateTimeField()
+
+
+class ArrangementMapSnapshot(models.Model):
+    """A snapshot of Cartographer arrangement map components which can be
+    shared between processes.
+
+    `loaded` is the UTC timestamp from which components which have been
+    modified or deleted are requested to bring the snapshot up to date.
+    """
+    baseurl = models.CharField(max_length=255, unique=True)
+    components = models.JSONField()
+    loaded = models.IntegerField()
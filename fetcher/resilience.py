@@ -0,0 +1,206 @@
+import asyncio
+import random
+import threading
+import time
+
+from pisces import settings
+
+from .concurrency import aspace_limiter
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class BulkheadFullError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops requests to an upstream service which is failing.
+
+    After `failure_threshold` consecutive failures the circuit opens, and
+    requests fail immediately rather than waiting for the service to time out.
+    After `reset_timeout` seconds a single trial request is allowed. If it
+    succeeds the circuit closes, otherwise it opens again. If the outcome of
+    the trial is never recorded, another trial is allowed after a further
+    `reset_timeout` seconds.
+
+    Args:
+        name (str): name of the upstream service.
+        failure_threshold (int): consecutive failures which open the circuit.
+        reset_timeout (float): seconds before a trial request is allowed.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def check(self):
+        """Raises CircuitOpenError if a request should not be made."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            if time.monotonic() - self.opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened = time.monotonic()
+                return
+            raise CircuitOpenError("{} is unavailable, requests have been stopped after {} failures".format(
+                self.name, self.failures))
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened = time.monotonic()
+
+
+class Upstream:
+    """Resilience policy for requests to an upstream service.
+
+    Idempotent requests which fail with a connection error, timeout or server
+    error are retried with jittered exponential backoff. Failures are counted by
+    a circuit breaker. Synchronous requests are made through a bulkhead, which
+    limits the number of threads which can be waiting on the service, so that a
+    slow service cannot occupy every thread. If a limiter is given, each attempt
+    also waits for capacity from the limiter.
+
+    Args:
+        name (str): name of the upstream service.
+        bulkhead_size (int): maximum number of concurrent synchronous requests.
+        limiter (AdaptiveLimiter): optional limiter for concurrent requests.
+    """
+
+    def __init__(self, name, bulkhead_size, limiter=None):
+        config = settings.UPSTREAM
+        self.name = name
+        self.limiter = limiter
+        self.timeout = config["timeout"]
+        self.retries = config["retries"]
+        self.backoff = config["backoff"]
+        self.breaker = CircuitBreaker(name, config["failure_threshold"], config["reset_timeout"])
+        self.bulkhead = threading.BoundedSemaphore(bulkhead_size)
+
+    def delay(self, attempt):
+        """Returns a jittered number of seconds to wait before a retry."""
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def call(self, send, retryable, errors, status, kind=None):
+        """Makes a synchronous request.
+
+        Args:
+            send (callable): makes a single attempt and returns a response.
+            retryable (bool): True if the request can safely be retried.
+            errors (tuple): exception classes raised for transient failures.
+            status (callable): returns the status code of a response.
+            kind (str): optional kind of request used by the limiter to track latency.
+        """
+        if not self.bulkhead.acquire(timeout=self.timeout):
+            raise BulkheadFullError("Too many requests waiting on {}".format(self.name))
+        try:
+            attempt = 0
+            while True:
+                self.breaker.check()
+                try:
+                    resp = self.attempt(send, errors, status, kind)
+                except errors:
+                    self.breaker.record_failure()
+                    if not retryable or attempt >= self.retries:
+                        raise
+                else:
+                    if status(resp) not in RETRY_STATUSES:
+                        self.breaker.record_success()
+                        return resp
+                    self.breaker.record_failure()
+                    if not retryable or attempt >= self.retries:
+                        return resp
+                    resp.close()
+                time.sleep(self.delay(attempt))
+                attempt += 1
+        finally:
+            self.bulkhead.release()
+
+    def attempt(self, send, errors, status, kind=None):
+        if not self.limiter:
+            return send()
+        self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            resp = send()
+        except errors:
+            self.limiter.release(failed=True)
+            raise
+        except Exception:
+            self.limiter.release()
+            raise
+        self.limiter.release(time.monotonic() - start, failed=status(resp) >= 500, kind=kind)
+        return resp
+
+    async def call_async(self, send, retryable, errors, status, kind=None):
+        """Makes an asynchronous request.
+
+        Args:
+            send (coroutine function): makes a single attempt and returns a response.
+            retryable (bool): True if the request can safely be retried.
+            errors (tuple): exception classes raised for transient failures.
+            status (callable): returns the status code of a response.
+            kind (str): optional kind of request used by the limiter to track latency.
+        """
+        attempt = 0
+        while True:
+            self.breaker.check()
+            try:
+                resp = await self.attempt_async(send, errors, status, kind)
+            except errors:
+                self.breaker.record_failure()
+                if not retryable or attempt >= self.retries:
+                    raise
+            else:
+                if status(resp) not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return resp
+                self.breaker.record_failure()
+                if not retryable or attempt >= self.retries:
+                    return resp
+                resp.release()
+            await asyncio.sleep(self.delay(attempt))
+            attempt += 1
+
+    async def attempt_async(self, send, errors, status, kind=None):
+        if not self.limiter:
+            return await send()
+        await self.limiter.acquire_async()
+        start = time.monotonic()
+        try:
+            resp = await send()
+        except errors:
+            self.limiter.release(failed=True)
+            raise
+        except Exception:
+            self.limiter.release()
+            raise
+        self.limiter.release(time.monotonic() - start, failed=status(resp) >= 500, kind=kind)
+        return resp
+
+
+aspace_upstream = Upstream(
+    "ArchivesSpace", settings.ARCHIVESSPACE["bulkhead_size"], limiter=aspace_limiter)
+cartographer_upstream = Upstream(
+    "Cartographer", settings.CARTOGRAPHER["bulkhead_size"])
@@ -17,7 +17,9 @@ class FetchRunSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = FetchRun
         fields = ('url', 'status', 'source', 'object_type', 'object_status',
-                  'error_count', 'errors', 'start_time', 'end_time', 'elapsed')
+                  'error_count', 'errors', 'processed', 'processed_chunks',
+                  'job_counts', 'cache_hits', 'cache_misses',
+                  'validation_time', 'start_time', 'end_time', 'elapsed')
 
     def get_source(self, obj):
         return obj.SOURCE_CHOICES[int(obj.source)][1]
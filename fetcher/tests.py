@@ -1,10 +1,16 @@
 import asyncio
+import json
+import os
 import random
-from datetime import datetime
-from unittest.mock import Mock, patch
+from copy import deepcopy
+from datetime import datetime, timedelta
+from threading import Thread
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytz
 import vcr
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from django.core import mail
 from django.test import TestCase
 from django.utils import timezone
@@ -12,21 +18,26 @@ from requests import Response
 from requests.exceptions import HTTPError
 from rest_framework.test import APIRequestFactory
 
-from .cron import (CleanUpCompleted, DeletedArchivesSpaceArchivalObjects,
-                   DeletedArchivesSpaceFamilies,
-                   DeletedArchivesSpaceOrganizations,
-                   DeletedArchivesSpacePeople, DeletedArchivesSpaceResources,
-                   DeletedArchivesSpaceSubjects,
-                   UpdatedArchivesSpaceArchivalObjects,
+from pisces import settings
+from transformer.assets import online_assets
+from transformer.transformers import Transformer
+
+from .clients import AsyncArchivesSpaceClient, AsyncAssetClient, ClientManager
+from .concurrency import AdaptiveLimiter, request_kind
+from .cron import (CleanUpCompleted, DeletedArchivesSpaceObjects,
+                   ProcessQueuedJobs, UpdatedArchivesSpaceArchivalObjects,
                    UpdatedArchivesSpaceFamilies,
                    UpdatedArchivesSpaceOrganizations,
                    UpdatedArchivesSpacePeople, UpdatedArchivesSpaceResources,
                    UpdatedArchivesSpaceSubjects,
                    UpdatedCartographerArrangementMapComponents)
 from .fetchers import ArchivesSpaceDataFetcher, CartographerDataFetcher
-from .helpers import (handle_deleted_uris, last_run_time,
+from .helpers import (acquire_lease, claim_jobs, complete_job,
+                      handle_deleted_uris, identifier_from_uri, last_run_time,
+                      release_lease, renew_jobs, renew_lease, resumable_run,
                       send_error_notification)
-from .models import FetchRun, FetchRunError
+from .models import CronLease, FetchJob, FetchRun, FetchRunError, SessionToken
+from .resilience import CircuitOpenError, Upstream
 from .views import FetchRunViewSet
 
 archivesspace_vcr = vcr.VCR(
@@ -65,9 +76,11 @@ class FetcherTest(TestCase):
                     f.save()
 
     @patch("transformer.transformers.Transformer.run")
+    @patch("merger.helpers.ArrangementMapIndex.refresh")
+    @patch("merger.mergers.ArchivalObjectMerger.prepare")
     @patch("merger.mergers.BaseMerger.merge")
     @patch("fetcher.helpers.identifier_from_uri")
-    def test_fetchers(self, mock_id, mock_merger, mock_transformer):
+    def test_fetchers(self, mock_id, mock_merger, mock_prepare, mock_refresh, mock_transformer):
         mock_id.return_value = None
         mock_merger.return_value = {}, {}
         mock_transformer.return_value = {}
@@ -122,21 +135,18 @@ class FetcherTest(TestCase):
                     self.assertEqual(updated_last_run, int(time.timestamp()))
 
     @patch("transformer.transformers.Transformer.run")
+    @patch("merger.helpers.ArrangementMapIndex.refresh")
+    @patch("merger.mergers.ArchivalObjectMerger.prepare")
     @patch("merger.mergers.BaseMerger.merge")
     @patch("fetcher.helpers.identifier_from_uri")
-    def test_cron(self, mock_id, mock_merger, mock_transformer):
+    def test_cron(self, mock_id, mock_merger, mock_prepare, mock_refresh, mock_transformer):
         for fetcher_vcr, cassette, cron in [
-                (archivesspace_vcr, "ArchivesSpace-deleted-agent_corporate_entity.json", DeletedArchivesSpaceOrganizations),
                 (archivesspace_vcr, "ArchivesSpace-updated-agent_corporate_entity.json", UpdatedArchivesSpaceOrganizations),
-                (archivesspace_vcr, "ArchivesSpace-deleted-agent_family.json", DeletedArchivesSpaceFamilies),
                 (archivesspace_vcr, "ArchivesSpace-updated-agent_family.json", UpdatedArchivesSpaceFamilies),
-                (archivesspace_vcr, "ArchivesSpace-deleted-agent_person.json", DeletedArchivesSpacePeople),
                 (archivesspace_vcr, "ArchivesSpace-updated-agent_person.json", UpdatedArchivesSpacePeople),
-                (archivesspace_vcr, "ArchivesSpace-deleted-subject.json", DeletedArchivesSpaceSubjects),
                 (archivesspace_vcr, "ArchivesSpace-updated-subject.json", UpdatedArchivesSpaceSubjects),
-                (archivesspace_vcr, "ArchivesSpace-deleted-resource.json", DeletedArchivesSpaceResources),
                 (archivesspace_vcr, "ArchivesSpace-updated-resource.json", UpdatedArchivesSpaceResources),
-                (archivesspace_vcr, "ArchivesSpace-deleted-archival_object.json", DeletedArchivesSpaceArchivalObjects),
+                (archivesspace_vcr, "ArchivesSpace-deleted-archival_object.json", DeletedArchivesSpaceObjects),
                 (archivesspace_vcr, "ArchivesSpace-updated-archival_object.json", UpdatedArchivesSpaceArchivalObjects),
                 (cartographer_vcr, "Cartographer-updated-arrangement_map_component.json", UpdatedCartographerArrangementMapComponents)]:
             with fetcher_vcr.use_cassette(cassette):
@@ -145,6 +155,111 @@ class FetcherTest(TestCase):
                 mock_transformer.return_value = {}
                 cron().do()
                 self.assertEqual(len(FetchRunError.objects.all()), 0)
+        for object_type, _ in FetchRun.ARCHIVESSPACE_OBJECT_TYPE_CHOICES:
+            self.assertEqual(
+                FetchRun.objects.filter(
+                    status=FetchRun.FINISHED,
+                    object_type=object_type,
+                    object_status="deleted",
+                    start_time__gt=pytz.utc.localize(datetime(2020, 3, 1))).count(), 1)
+
+    @patch("fetcher.cron.BaseCron.export")
+    def test_cron_lease(self, mock_export):
+        """Ensures cron jobs only run while holding an unexpired lease."""
+        code = UpdatedArchivesSpacePeople.code
+        self.assertTrue(acquire_lease(code, "host-a"))
+        self.assertFalse(acquire_lease(code, "host-b"))
+        UpdatedArchivesSpacePeople().do()
+        mock_export.assert_not_called()
+
+        CronLease.objects.filter(code=code).update(expires=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(acquire_lease(code, "host-b"))
+        self.assertFalse(renew_lease(code, "host-a"))
+        self.assertTrue(renew_lease(code, "host-b"))
+        release_lease(code, "host-b")
+
+        UpdatedArchivesSpacePeople().do()
+        mock_export.assert_called_once()
+        self.assertFalse(CronLease.objects.filter(code=code).exists())
+
+    def test_adaptive_limiter(self):
+        """Ensures concurrent requests are limited and the limit is adjusted."""
+        limiter = AdaptiveLimiter(2, 10, latency_tolerance=2.0, window=20)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.1)
+        self.assertEqual(limiter.limit, 10)
+
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(0.5)
+        self.assertEqual(limiter.limit, 5)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(failed=True)
+        self.assertEqual(limiter.limit, 2.5)
+        limiter.acquire()
+        limiter.release(failed=True)
+        self.assertEqual(limiter.limit, 2.5)
+
+        async def acquire_all():
+            await asyncio.gather(*[limiter.acquire_async() for _ in range(int(limiter.limit))])
+            waiting = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            limiter.release(failed=True)
+            await asyncio.wait_for(waiting, 1)
+        asyncio.get_event_loop().run_until_complete(acquire_all())
+        self.assertEqual(limiter.in_flight, 2)
+
+    def test_adaptive_limiter_recovery(self):
+        """Ensures the limit recovers when latency rises and stays high, and that
+        latency is compared between requests of the same kind."""
+        limiter = AdaptiveLimiter(2, 10, latency_tolerance=2.0, window=20, baseline_windows=3)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.1)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(1.0, kind=request_kind("/repositories/2/archival_objects", {"id_set": [1, 2]}))
+        self.assertEqual(limiter.limit, 10)
+
+        for _ in range(60):
+            limiter.acquire()
+            limiter.release(0.5)
+        self.assertLess(limiter.limit, 10)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.5)
+        self.assertEqual(limiter.limit, 10)
+
+    @patch.dict("pisces.settings.UPSTREAM", {"retries": 2, "backoff": 0, "failure_threshold": 3, "reset_timeout": 30})
+    def test_upstream_resilience(self):
+        """Ensures requests are retried and stopped when an upstream is failing."""
+        upstream = Upstream("Test", 2)
+        responses = [Mock(status_code=503), Mock(status_code=502), Mock(status_code=200)]
+        send = Mock(side_effect=responses)
+        self.assertEqual(upstream.call(send, True, (HTTPError,), lambda r: r.status_code), responses[2])
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(upstream.breaker.state, upstream.breaker.CLOSED)
+
+        send = Mock(return_value=Mock(status_code=503))
+        self.assertEqual(upstream.call(send, False, (HTTPError,), lambda r: r.status_code).status_code, 503)
+        self.assertEqual(send.call_count, 1)
+
+        send = Mock(side_effect=HTTPError("Unavailable"))
+        with self.assertRaises(CircuitOpenError):
+            upstream.call(send, True, (HTTPError,), lambda r: r.status_code)
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(upstream.breaker.state, upstream.breaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            upstream.call(send, True, (HTTPError,), lambda r: r.status_code)
+        self.assertEqual(send.call_count, 2)
+
+        upstream.breaker.opened -= 30
+        send = Mock(return_value=Mock(status_code=200))
+        upstream.call(send, True, (HTTPError,), lambda r: r.status_code)
+        self.assertEqual(upstream.breaker.state, upstream.breaker.CLOSED)
 
     def test_error_notifications(self):
         fetch_run = FetchRun.objects.create(
@@ -216,3 +331,304 @@ class FetcherTest(TestCase):
         self.assertEqual(fetch_run.error_count, 1)
         for e in fetch_run.errors:
             self.assertTrue(str(context.exception) in e.message)
+
+    def test_async_aspace_params(self):
+        """Ensures list parameters are formatted the way ArchivesSpace expects."""
+        client = AsyncArchivesSpaceClient("https://example.com/api", "admin", "admin", session_token="foo")
+        params = client.prepare_params({"id_set": [1, 2], "resolve[]": ["subjects"], "all_ids": True})
+        self.assertEqual(
+            params,
+            [("id_set[]", "1"), ("id_set[]", "2"), ("resolve[]", "subjects"), ("all_ids", "True")])
+        self.assertEqual(client.get_headers(), {"X-ArchivesSpace-Session": "foo"})
+
+    def test_get_id_list(self):
+        """Ensures lists of ids are parsed correctly when split across chunks."""
+        async def iter_chunked(size):
+            for chunk in [b"[1", b"2,34,5", b"6,", b"7]"]:
+                yield chunk
+        resp = MagicMock()
+        resp.content.iter_chunked = iter_chunked
+        client = AsyncArchivesSpaceClient("https://example.com/api", "admin", "admin", session_token="foo")
+        client.request = AsyncMock(return_value=resp)
+        ids = asyncio.get_event_loop().run_until_complete(client.get_id_list("/subjects"))
+        self.assertEqual(list(ids), [12, 34, 56, 7])
+
+    def test_get_record(self):
+        """Ensures records are only requested once while a client is open."""
+        client = AsyncArchivesSpaceClient("https://example.com/api", "admin", "admin", session_token="foo", record_cache_size=1)
+        client.get = AsyncMock(side_effect=lambda url, params=None: {"uri": url})
+
+        async def get_records(urls):
+            return await asyncio.gather(*[client.get_record(url) for url in urls])
+        records = asyncio.get_event_loop().run_until_complete(
+            get_records(["/subjects/1", "/subjects/1", "/subjects/1", "/subjects/2", "/subjects/1"]))
+        self.assertEqual([r["uri"] for r in records], ["/subjects/1", "/subjects/1", "/subjects/1", "/subjects/2", "/subjects/1"])
+        self.assertEqual(client.get.call_count, 3)
+
+    @patch.dict("pisces.settings.ARCHIVESSPACE", {"reference_cache": True})
+    def test_resolve_references(self):
+        """Ensures references in pages are resolved from records requested once per run."""
+        records = {
+            "/repositories/2/resources/1": {"title": "Collection", "linked_agents": []},
+            "/agents/people/1": {"title": "Person", "agent_type": "agent_person"},
+            "/subjects/1": {"title": "Subject", "terms": []},
+            "/repositories/2/top_containers/1": {"indicator": "1"}}
+
+        def get_page(id_list):
+            return [{
+                "uri": "/repositories/2/archival_objects/{}".format(i),
+                "ancestors": [{"ref": "/repositories/2/resources/1", "level": "collection"}],
+                "linked_agents": [{"ref": "/agents/people/1", "role": "creator"}],
+                "subjects": [{"ref": "/subjects/1"}],
+                "instances": [{"sub_container": {"top_container": {"ref": "/repositories/2/top_containers/1"}}}, {"digital_object": {"ref": "/repositories/2/digital_objects/1"}}]}
+                for i in id_list]
+        fetcher = ArchivesSpaceDataFetcher()
+        fetcher.object_type = "archival_object"
+        fetcher.async_client = AsyncArchivesSpaceClient("https://example.com/api", "admin", "admin", session_token="foo", record_cache_size=10)
+        fetcher.async_client.get = AsyncMock(
+            side_effect=lambda url, params=None: get_page(params["id_set"]) if params and "id_set" in params else records[url])
+        page = asyncio.get_event_loop().run_until_complete(fetcher.get_page([1, 2]))
+        self.assertEqual(fetcher.async_client.get.call_count, 5)
+        self.assertEqual(fetcher.async_client.get.call_args_list[0].kwargs["params"], {"id_set": [1, 2]})
+        self.assertIn(("/repositories/2/resources/1", (("resolve[]", "linked_agents"),)), fetcher.async_client.records)
+        for obj in page:
+            self.assertEqual(obj["ancestors"][0]["_resolved"]["title"], "Collection")
+            self.assertEqual(obj["linked_agents"][0]["_resolved"]["title"], "Person")
+            self.assertEqual(obj["subjects"][0]["_resolved"]["title"], "Subject")
+            self.assertEqual(obj["instances"][0]["sub_container"]["top_container"]["_resolved"]["indicator"], "1")
+        self.assertIsNot(page[0]["subjects"][0]["_resolved"], page[1]["subjects"][0]["_resolved"])
+
+    @patch("pisces.settings.CONNECTION_POOL_SIZE", 2)
+    def test_asset_client(self):
+        """Ensures assets are looked up by an asset client with a bounded number of connections."""
+        requests = {"open": 0, "max": 0}
+
+        async def head(request):
+            requests["open"] += 1
+            requests["max"] = max(requests["max"], requests["open"])
+            await asyncio.sleep(0.01)
+            requests["open"] -= 1
+            return web.Response(status=200 if request.match_info["identifier"].startswith("available") else 404)
+
+        async def lookup(identifiers):
+            app = web.Application()
+            app.router.add_route("HEAD", "/pdfs/{identifier}", head)
+            async with TestServer(app) as server, AsyncAssetClient(str(server.make_url("/"))) as client:
+                return await asyncio.gather(*[client.has_asset(identifier) for identifier in identifiers])
+        identifiers = ["available{}".format(i) for i in range(5)] + ["missing{}".format(i) for i in range(5)]
+        results = asyncio.get_event_loop().run_until_complete(lookup(identifiers))
+        self.assertEqual(results, [True] * 5 + [False] * 5)
+        self.assertEqual(requests["max"], 2)
+
+    @patch("transformer.mappings.requests.head")
+    def test_online_lookup(self, mock_head):
+        """Ensures online assets are looked up once per identifier and the result is used by transforms."""
+        digital = {"uri": "/repositories/2/archival_objects/1", "instances": [{"instance_type": "digital_object"}]}
+        fetcher = ArchivesSpaceDataFetcher()
+        fetcher.asset_lookups = {}
+        fetcher.asset_client = Mock()
+        fetcher.asset_client.has_asset = AsyncMock(return_value=True)
+        loop = asyncio.get_event_loop()
+        results = loop.run_until_complete(asyncio.gather(
+            fetcher.get_online(digital),
+            fetcher.get_online(deepcopy(digital)),
+            fetcher.get_online({"uri": "/repositories/2/archival_objects/2", "instances": []})))
+        self.assertEqual(results, [True, True, False])
+        fetcher.asset_client.has_asset.assert_called_once_with(identifier_from_uri(digital["uri"]))
+        fetcher.asset_lookups = {}
+        self.assertTrue(loop.run_until_complete(fetcher.get_online(digital)))
+        fetcher.asset_client.has_asset.assert_called_once()
+        online_assets.clear()
+
+        object_dir = os.path.join("fixtures", "transformer", "archival_object")
+        with open(os.path.join(object_dir, sorted(os.listdir(object_dir))[0]), "r") as json_file:
+            source = json.load(json_file)
+        with open(os.path.join("fixtures", "transformer", "online_instance", "online_instance.json"), "r") as json_file:
+            source["instances"] = json.load(json_file)
+        for online in [True, False]:
+            transformed, online_pending = Transformer().transform("archival_object", source, online)
+            self.assertEqual(transformed["online"], online)
+            self.assertEqual(online_pending, not online)
+        mock_head.assert_not_called()
+
+    @patch.dict("pisces.settings.CARTOGRAPHER", {"map_merge": True})
+    @patch("fetcher.fetchers.fetch_resources")
+    def test_map_merge(self, mock_resources):
+        """Ensures all components in updated arrangement maps are loaded once and merged."""
+        def component(component_id, parent=None, children=None):
+            return {
+                "id": component_id,
+                "ref": "/api/components/{}/".format(component_id),
+                "title": "Component {}".format(component_id),
+                "map": 1,
+                "parent": parent,
+                "order": component_id,
+                "level": "collection",
+                "archivesspace_uri": "/repositories/2/resources/{}".format(component_id),
+                "ancestors": [],
+                "children": [{"ref": "/api/components/{}/".format(child)} for child in children or []]}
+        responses = {
+            "/api/components/": {"results": [{"id": 2}]},
+            "/api/components/1/": component(1, children=[2]),
+            "/api/components/2/": dict(component(2, 1, [3]), ancestors=[{"ref": "/api/components/1/"}]),
+            "/api/components/3/": component(3, 2)}
+        mock_resources.side_effect = lambda uris: {uri: {"uri": uri} for uri in uris}
+        fetcher = CartographerDataFetcher()
+        fetcher.last_run = 0
+        fetcher.async_client = Mock()
+        fetcher.async_client.get = AsyncMock(side_effect=lambda url, **kwargs: responses[url])
+        updated = asyncio.get_event_loop().run_until_complete(fetcher.get_updated())
+        self.assertEqual(updated, ["/api/components/1/", "/api/components/2/", "/api/components/3/"])
+        self.assertEqual(sorted(c.args[0] for c in fetcher.async_client.get.call_args_list), sorted(responses))
+        mock_resources.assert_called_once_with(["/repositories/2/resources/2", "/repositories/2/resources/1", "/repositories/2/resources/3"])
+        item = asyncio.get_event_loop().run_until_complete(fetcher.get_item("/api/components/3/"))
+        self.assertEqual(item["_resolved"], {"uri": "/repositories/2/resources/3"})
+        self.assertEqual([a["ref"] for a in item["ancestors"]], ["/api/components/2/", "/api/components/1/"])
+        self.assertEqual(item["ancestors"][1]["title"], "Component 1")
+        self.assertEqual(fetcher.async_client.get.call_count, len(responses))
+
+    @patch("fetcher.fetchers.handle_deleted_uris")
+    @patch("fetcher.fetchers.BaseDataFetcher.handle_data")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_page")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_updated")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_async_client")
+    @patch("fetcher.fetchers.BaseDataFetcher.instantiate_clients")
+    @patch("merger.helpers.ArrangementMapIndex.refresh")
+    def test_arrangement_map_refresh(self, mock_refresh, mock_clients, mock_async_client, mock_updated, mock_page, mock_handle, mock_deleted):
+        """Ensures arrangement maps are only refreshed when there are records to merge."""
+        mock_clients.return_value = {"aspace": Mock(), "cartographer": Mock()}
+        mock_async_client.return_value = MagicMock()
+        mock_page.side_effect = lambda id_list: [{"id": i} for i in id_list]
+        mock_updated.return_value = []
+        ArchivesSpaceDataFetcher().fetch("updated", "archival_object")
+        mock_refresh.assert_not_called()
+        mock_updated.return_value = [1, 2]
+        ArchivesSpaceDataFetcher().fetch("updated", "archival_object")
+        mock_refresh.assert_called_once_with(mock_clients.return_value["cartographer"])
+
+    @patch.dict("pisces.settings.CARTOGRAPHER", {"cartographer_use": False})
+    def test_client_manager(self):
+        """Ensures stored session tokens are reused and each thread gets its own clients."""
+        SessionToken.objects.create(
+            baseurl=settings.ARCHIVESSPACE["baseurl"],
+            username=settings.ARCHIVESSPACE["username"],
+            token="foo",
+            expires=timezone.now() + timedelta(seconds=60))
+        manager = ClientManager()
+        self.assertIs(manager.clients(), manager.clients())
+        thread_clients = []
+        threads = [Thread(target=lambda: thread_clients.append(manager.clients())) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        aspace_clients = [c["aspace"].client for c in thread_clients + [manager.clients()]]
+        self.assertEqual(len(set(id(c) for c in aspace_clients)), 3)
+        for client in aspace_clients:
+            self.assertEqual(client.session.headers["X-ArchivesSpace-Session"], "foo")
+            self.assertIs(client.session.get_adapter(settings.ARCHIVESSPACE["baseurl"]), manager.adapters["aspace"])
+
+    @patch("fetcher.fetchers.handle_deleted_uris")
+    @patch("fetcher.fetchers.BaseDataFetcher.handle_data")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_page")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_async_client")
+    @patch("fetcher.fetchers.BaseDataFetcher.instantiate_clients")
+    def test_resume(self, mock_clients, mock_async_client, mock_page, mock_handle, mock_deleted):
+        """Ensures unfinished fetches are resumed from their last processed chunk."""
+        mock_async_client.return_value = MagicMock()
+        mock_page.side_effect = lambda id_list: [{"id": i} for i in id_list]
+        fetched = list(range(1, 101))
+        unfinished = FetchRun.objects.create(
+            status=FetchRun.ERRORED,
+            source=FetchRun.ARCHIVESSPACE,
+            object_type="archival_object",
+            object_status="updated",
+            fetched=fetched,
+            processed_chunks=2)
+        processed = ArchivesSpaceDataFetcher().fetch("updated", "archival_object", resume=True)
+        self.assertEqual(processed, 50)
+        self.assertEqual(
+            sorted(i for call in mock_page.call_args_list for i in call.args[0]),
+            fetched[50:])
+        unfinished.refresh_from_db()
+        self.assertEqual(int(unfinished.status), FetchRun.FINISHED)
+        self.assertEqual(unfinished.processed_chunks, 4)
+        self.assertIsNone(unfinished.fetched)
+        self.assertIsNone(resumable_run(FetchRun.ARCHIVESSPACE, "updated", "archival_object"))
+
+    @patch.dict("pisces.settings.JOB_QUEUE", {"queue_use": True, "max_attempts": 2})
+    @patch("fetcher.fetchers.handle_deleted_uris")
+    @patch("fetcher.fetchers.BaseDataFetcher.handle_data")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_page")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_updated")
+    @patch("fetcher.fetchers.ArchivesSpaceDataFetcher.get_async_client")
+    @patch("fetcher.fetchers.BaseDataFetcher.instantiate_clients")
+    def test_job_queue(self, mock_clients, mock_async_client, mock_updated, mock_page, mock_handle, mock_deleted):
+        """Ensures fetched data is queued and processed by workers."""
+        mock_async_client.return_value = MagicMock()
+        mock_updated.return_value = list(range(1, 101))
+        failed = []
+
+        def get_page(id_list):
+            if 1 in id_list and not failed:
+                failed.append(id_list)
+                raise Exception("Temporary error")
+            return [{"id": i} for i in id_list]
+        mock_page.side_effect = get_page
+
+        fetcher = ArchivesSpaceDataFetcher()
+        self.assertEqual(fetcher.fetch("updated", "archival_object"), 0)
+        run = fetcher.current_run
+        self.assertEqual(FetchJob.objects.filter(run=run, status=FetchJob.QUEUED).count(), 4)
+        self.assertEqual(int(FetchRun.objects.get(pk=run.pk).status), FetchRun.STARTED)
+        mock_page.assert_not_called()
+
+        run_count = FetchRun.objects.count()
+        fetcher = ArchivesSpaceDataFetcher()
+        self.assertEqual(fetcher.fetch("updated", "archival_object", resume=True), 0)
+        self.assertTrue(fetcher.skipped)
+        self.assertEqual(fetcher.current_run, run)
+        self.assertEqual(FetchRun.objects.count(), run_count)
+        self.assertEqual(FetchJob.objects.count(), 4)
+        mock_updated.assert_called_once()
+
+        ProcessQueuedJobs().do()
+        run.refresh_from_db()
+        self.assertEqual(int(run.status), FetchRun.FINISHED)
+        self.assertEqual(run.processed, 100)
+        self.assertEqual(run.error_count, 0)
+        self.assertEqual(run.job_counts["Finished"], 4)
+        self.assertEqual(FetchJob.objects.get(run=run, index=0).attempts, 2)
+
+        expired = FetchRun.objects.create(
+            status=FetchRun.STARTED,
+            source=FetchRun.ARCHIVESSPACE,
+            object_type="archival_object",
+            object_status="updated")
+        FetchJob.objects.create(
+            run=expired, index=0, data=[1], status=FetchJob.CLAIMED, attempts=2,
+            lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_jobs("test"), [])
+        expired.refresh_from_db()
+        self.assertEqual(int(expired.status), FetchRun.FINISHED)
+        self.assertEqual(expired.error_count, 1)
+        self.assertEqual(expired.job_counts["Errored"], 1)
+
+        reclaimed = FetchRun.objects.create(
+            status=FetchRun.STARTED,
+            source=FetchRun.ARCHIVESSPACE,
+            object_type="archival_object",
+            object_status="updated")
+        FetchJob.objects.create(run=reclaimed, index=0, data=[1, 2], status=FetchJob.QUEUED)
+        [job] = claim_jobs("host-a")
+        self.assertEqual(renew_jobs("host-a", [job]), 1)
+        FetchJob.objects.filter(pk=job.pk).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        [job_b] = claim_jobs("host-b")
+        self.assertEqual(renew_jobs("host-a", [job]), 0)
+        complete_job(job, 2)
+        self.assertEqual(FetchJob.objects.get(pk=job.pk).status, FetchJob.CLAIMED)
+        complete_job(job_b, 2)
+        complete_job(job_b, 2)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.processed, 2)
+        self.assertEqual(int(reclaimed.status), FetchRun.FINISHED)
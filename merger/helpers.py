@@ -1,6 +1,11 @@
 import re
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
 
 from fetcher.helpers import instantiate_aspace, list_chunks
+from fetcher.models import ArrangementMapSnapshot
 from pisces import settings
 
 
@@ -85,9 +90,25 @@ def combine_references(object):
     return object
 
 
-def add_group(object, aspace_client):
-    """Adds group object, with data about the highest-level collection containing this object."""
+def add_group(object, aspace_client, cache=None):
+    """Adds group object, with data about the highest-level collection containing this object.
 
+    If a run cache is provided, groups are cached by the URI and lock_version of
+    the top ancestor, so they are only created once for each collection.
+    """
+    if object.get("ancestors") and cache:
+        last_ancestor = object["ancestors"][-1]
+        key = ("group",
+               last_ancestor.get("archivesspace_uri", last_ancestor.get("ref")),
+               last_ancestor.get("_resolved", {}).get("lock_version"))
+        object["group"] = deepcopy(cache.get(key, lambda: get_group(object, aspace_client)))
+    else:
+        object["group"] = get_group(object, aspace_client)
+    return object
+
+
+def get_group(object, aspace_client):
+    """Returns a group object for the highest-level collection containing this object."""
     top_ancestor = object
     if object.get("ancestors"):
         last_ancestor = object["ancestors"][-1]
@@ -101,13 +122,12 @@ def add_group(object, aspace_client):
     if object["jsonmodel_type"].startswith("agent_"):
         creators = [{"ref": object["uri"], "role": "creator", "type": object["jsonmodel_type"], "title": object["title"]}]
 
-    object["group"] = {
+    return {
         "identifier": group_obj.get("ref", group_obj.get("uri")),
         "creators": creators,
         "dates": group_obj.get("dates", group_obj.get("dates_of_existence", [])),
         "title": group_obj.get("title"),
     }
-    return object
 
 
 def handle_cartographer_reference(reference):
@@ -117,13 +137,235 @@ def handle_cartographer_reference(reference):
     return reference
 
 
+def add_map_ancestors(components):
+    """Returns copies of arrangement map components with their ancestors,
+    closest first, worked out from the parents of the other components.
+
+    Args:
+        components (list): every component in one or more arrangement maps.
+    """
+    parents = {component["id"]: component for component in components}
+    with_ancestors = []
+    for component in components:
+        ancestors = []
+        parent = parents.get(component["parent"])
+        while parent:
+            ancestors.append({key: parent[key] for key in ["title", "ref", "archivesspace_uri", "level", "order"]})
+            parent = parents.get(parent["parent"])
+        with_ancestors.append(dict(component, ancestors=ancestors))
+    return with_ancestors
+
+
+class TreeIndex:
+    """Data about the tree of a single resource.
+
+    Holds tree nodes, pages of children and counts of objects before each
+    position, so that data shared by objects in the same resource is only
+    fetched once. If a run cache is provided, data is kept in the run cache
+    and only lasts for a single run, otherwise it lasts as long as the index.
+
+    Args:
+        cache (RunCache): optional cache for the current run.
+        resource_uri (str): the URI of the resource.
+        version (int): the lock_version of the resource.
+    """
+
+    def __init__(self, cache=None, resource_uri=None, version=None):
+        self.cache = cache
+        self.resource_uri = resource_uri
+        self.version = version
+        self.data = {}
+
+    def get(self, key, fetch):
+        """Returns a cached value, calling fetch to get it if it is not cached."""
+        if self.cache:
+            return self.cache.get(("tree_index", self.resource_uri, self.version, key), fetch)
+        if key not in self.data:
+            self.data[key] = fetch()
+        return self.data[key]
+
+
+class ArrangementMapIndex:
+    """Snapshot of Cartographer arrangement map components, keyed by ArchivesSpace URI.
+
+    Each component is stored with its map and ancestors, so merges do not need
+    to request them from Cartographer. The snapshot is stored in the database
+    so that it is shared between processes, along with the time from which it
+    was last brought up to date. Once the snapshot has been loaded, refreshing
+    it only requests components which have been modified or deleted since then,
+    and works out the ancestors of the other components in their arrangement
+    maps from the snapshot.
+    """
+
+    def __init__(self):
+        self.components = None
+        self.loaded = None
+        self.lock = threading.Lock()
+
+    def refresh(self, client):
+        """Brings the snapshot up to date, loading it if it has not been stored.
+
+        Args:
+            client (ElectronBond): Cartographer client.
+        """
+        with self.lock:
+            if self.components is None:
+                self.read()
+            loaded = int(time.time())
+            if self.components is None:
+                components = self.load_components(client, [result["id"] for result in client.get_paged("/api/components/")])
+            else:
+                modified = [result["id"] for result in client.get_paged("/api/components/", params={"modified_since": self.loaded})]
+                deleted = [result["archivesspace_uri"] for result in client.get_paged("/api/delete-feed/", params={"deleted_since": self.loaded})
+                           if "/api/components/" in result["ref"]]
+                if not (modified or deleted):
+                    return
+                components = self.update_components(client, modified, deleted)
+            self.components, self.loaded = components, loaded
+            self.save()
+
+    def load_components(self, client, ids):
+        """Returns components requested from Cartographer, keyed by ArchivesSpace URI."""
+        components = {}
+        for component_id in ids:
+            resp = client.get(f"/api/components/{component_id}/")
+            resp.raise_for_status()
+            component = resp.json()
+            components[component["archivesspace_uri"]] = component
+        return components
+
+    def update_components(self, client, modified, deleted):
+        """Returns a copy of the snapshot with modified and deleted components
+        replaced, and the ancestors of the other components in their
+        arrangement maps updated.
+
+        Args:
+            modified (list): ids of modified components.
+            deleted (list): ArchivesSpace URIs of deleted components.
+        """
+        components = dict(self.components)
+        uris = {component["id"]: uri for uri, component in components.items()}
+        maps = set()
+        for uri in deleted + [uris[component_id] for component_id in modified if component_id in uris]:
+            if uri in components:
+                maps.add(components.pop(uri)["map"])
+        updated = self.load_components(client, modified)
+        maps.update(component["map"] for component in updated.values())
+        components.update(updated)
+        components.update({c["archivesspace_uri"]: c for c in add_map_ancestors([c for c in components.values() if c["map"] in maps])})
+        return components
+
+    def read(self):
+        snapshot = ArrangementMapSnapshot.objects.filter(baseurl=settings.CARTOGRAPHER["baseurl"]).first()
+        if snapshot:
+            self.components, self.loaded = snapshot.components, snapshot.loaded
+
+    def save(self):
+        ArrangementMapSnapshot.objects.update_or_create(
+            baseurl=settings.CARTOGRAPHER["baseurl"],
+            defaults={"components": self.components, "loaded": self.loaded})
+
+    def get(self, uri, fetch):
+        """Returns a copy of the component for an ArchivesSpace URI, or None if
+        there is no such component. If the snapshot is not loaded, calls fetch
+        to get the component."""
+        components = self.components
+        if components is None:
+            return fetch()
+        component = components.get(uri)
+        return deepcopy(component) if component else None
+
+    def invalidate(self):
+        with self.lock:
+            self.components = None
+
+
+arrangement_maps = ArrangementMapIndex()
+
+
+class RunCache:
+    """Least recently used cache of responses which lasts for a single run.
+
+    If a value is requested while another thread is already fetching it, the
+    request waits for that fetch to finish rather than making its own.
+
+    Args:
+        max_size (int): maximum number of values to keep.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """Returns a cached value, calling fetch to get it if it is not cached."""
+        with self.lock:
+            if key in self.values:
+                self.values.move_to_end(key)
+                self.hits += 1
+                return self.values[key]
+            fetching = self.in_flight.get(key)
+            if fetching:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.in_flight[key] = threading.Event()
+        if fetching:
+            fetching.wait()
+            with self.lock:
+                if key in self.values:
+                    return self.values[key]
+            return fetch()
+        try:
+            value = fetch()
+            with self.lock:
+                self.values[key] = value
+                while len(self.values) > self.max_size:
+                    self.values.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                self.in_flight.pop(key).set()
+
+    def peek(self, key):
+        """Returns a cached value, or None if it is not cached."""
+        with self.lock:
+            if key not in self.values:
+                return None
+            self.values.move_to_end(key)
+            self.hits += 1
+            return self.values[key]
+
+    def set(self, key, value):
+        """Caches a value which was fetched along with another value."""
+        with self.lock:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+
 class ArchivesSpaceHelper:
-    def __init__(self, aspace):
+    def __init__(self, aspace, cache=None):
         self.aspace = aspace if aspace else instantiate_aspace(settings.ARCHIVESSPACE)
+        self.cache = cache
+
+    def cached(self, key, fetch):
+        """Returns a value from the run cache if there is one, otherwise fetches it."""
+        return self.cache.get(key, fetch) if self.cache else fetch()
 
     def has_children(self, uri):
         """Checks whether an archival object has children using the tree/node endpoint.
-        Checks the child_count attribute and if the value is greater than 0, return true, otherwise return False."""
+        Checks the child_count attribute and if the value is greater than 0, return true, otherwise return False.
+
+        If a child count has already been cached by `child_counts`, no requests are made."""
+        child_count = self.cache.peek(("child_count", uri)) if self.cache else None
+        if child_count is not None:
+            return child_count > 0
         resp = self.aspace.client.get(uri)
         if resp.status_code == 404:
             raise MissingArchivalObjectError("{} cannot be found".format(uri))
@@ -134,14 +376,21 @@ class ArchivesSpaceHelper:
 
     def tree_root(self, resource_uri):
         """Gets a resource tree starting at the root."""
-        return self.aspace.client.get(f"{resource_uri}/tree/root").json()
+        return self.cached(
+            ("tree_root", resource_uri),
+            lambda: self.aspace.client.get(f"{resource_uri}/tree/root").json())
 
     def tree_node(self, resource_uri, node_uri):
         """Gets a resource tree starting at a node."""
-        return self.aspace.client.get(f"{resource_uri}/tree/node?node_uri={node_uri}").json()
+        return self.cached(
+            ("tree_node", resource_uri, node_uri),
+            lambda: self.aspace.client.get(f"{resource_uri}/tree/node?node_uri={node_uri}").json())
 
     def objects_within(self, uri_list):
         """Gets the number of objects which have a URI in their ancestors array."""
+        return self.cached(("objects_within", tuple(uri_list)), lambda: self.fetch_objects_within(uri_list))
+
+    def fetch_objects_within(self, uri_list):
         count = 0
         for chunk in list_chunks(uri_list, 190):
             search_uri = f"search?q={{!terms f=ancestors}}{','.join(chunk)} AND publish:true&page=1&fields[]=uri&type[]=archival_object&page_size=1"
@@ -153,19 +402,96 @@ class ArchivesSpaceHelper:
                 raise Exception(f"Error fetching child counts for URI {result.url}: {e}")
         return count
 
-    def objects_before(self, target_node, initial_node, resource_uri, parent_uri=None):
-        """Gets a count of previous archival objects in a resource."""
+    def child_counts(self, objects):
+        """Caches child counts for a page of archival objects.
+
+        Counts are read from the pages of children of each object's parent, so
+        each page is only fetched once for all the siblings on it.
+        """
+        if not self.cache:
+            return
+        for obj in objects:
+            resource_uri = obj["resource"]["ref"]
+            parent_uri = obj.get("parent", {}).get("ref")
+            index = self.tree_index(resource_uri, obj["ancestors"][-1].get("_resolved", {}).get("lock_version"))
+            parent_node = self.index_node(index, resource_uri, parent_uri)
+            offset = obj["position"] // parent_node["waypoint_size"]
+            for result in self.index_page(index, resource_uri, parent_uri, offset):
+                self.cache.set(("child_count", result["uri"]), result["child_count"])
+
+    def index_node(self, index, resource_uri, parent_uri=None):
+        """Returns a tree node from a tree index, or the tree root if there is no parent."""
+        node_url = f"{resource_uri}/tree/node?node_uri={parent_uri}" if parent_uri else f"{resource_uri}/tree/root"
+        return index.get(("node", parent_uri), lambda: self.aspace.client.get(node_url).json())
+
+    def index_page(self, index, resource_uri, parent_uri, offset):
+        """Returns a page of a node's children from a tree index."""
+        results_url = (f"{resource_uri}/tree/waypoint?offset={offset}&parent_node={parent_uri}" if parent_uri else
+                       f"{resource_uri}/tree/waypoint?offset={offset}")
+        return index.get(("page", parent_uri, offset), lambda: self.aspace.client.get(results_url).json())
+
+    def tree_index(self, resource_uri, version=None):
+        """Returns the tree index for a resource, which is kept in the run cache."""
+        return TreeIndex(self.cache, resource_uri, version)
+
+    def objects_before(self, index, target_node, resource_uri, parent_uri=None):
+        """Gets a count of previous archival objects in a resource.
+
+        Tree nodes, pages of children and counts of objects in previous pages are
+        cached in the resource's tree index, so only the count of objects
+        before the target node in its own page is fetched for each new position.
+        """
         count = 0
         target_position = target_node["position"] if ("position" in target_node) else target_node["_resolved"]["position"]
+        initial_node = self.index_node(index, resource_uri, parent_uri)
         for offset in range(initial_node["waypoints"]):
-            results_url = (f"{resource_uri}/tree/waypoint?offset={offset}&parent_node={parent_uri}" if parent_uri else
-                           f"{resource_uri}/tree/waypoint?offset={offset}")
-            results_page = self.aspace.client.get(results_url).json()
+            results_page = self.index_page(index, resource_uri, parent_uri, offset)
             if target_position < ((offset + 1) * initial_node["waypoint_size"]):
                 previous_results = [r for r in results_page if r["position"] < target_position]
-                count += sum([self.objects_within([p["uri"] for p in previous_results]), len(previous_results)])
+                count += index.get(
+                    ("count", parent_uri, offset, target_position),
+                    lambda: sum([self.objects_within([p["uri"] for p in previous_results]), len(previous_results)]))
                 count += 1
                 return count
-            count += sum([self.objects_within([r["uri"] for r in results_page]), len(results_page)])
+            count += index.get(
+                ("count", parent_uri, offset, None),
+                lambda: sum([self.objects_within([r["uri"] for r in results_page]), len(results_page)]))
             count += 1
         return count
+
+    def sibling_objects_before(self, index, target_nodes, resource_uri, parent_uri=None):
+        """Gets counts of previous archival objects in a resource for siblings.
+
+        All target nodes must have the same parent. The parent's children are
+        scanned once in order, and the count for each target is the count for
+        the target before it plus the objects between them, so each previous
+        sibling is only counted once. Counts are cached in the resource's tree
+        index in the same way as by `objects_before`.
+
+        Returns:
+            dict: counts keyed by the position of each target node.
+        """
+        remaining = sorted({n["position"] if ("position" in n) else n["_resolved"]["position"] for n in target_nodes})
+        counts = {}
+        count = 0
+        initial_node = self.index_node(index, resource_uri, parent_uri)
+        for offset in range(initial_node["waypoints"]):
+            if not remaining:
+                break
+            results_page = self.index_page(index, resource_uri, parent_uri, offset)
+            previous_position, previous_count = None, 0
+            while remaining and remaining[0] < ((offset + 1) * initial_node["waypoint_size"]):
+                target_position = remaining.pop(0)
+                between = [r for r in results_page if r["position"] < target_position and (
+                    previous_position is None or r["position"] >= previous_position)]
+                previous_count = index.get(
+                    ("count", parent_uri, offset, target_position),
+                    lambda: sum([previous_count, self.objects_within([r["uri"] for r in between]) if between else 0, len(between)]))
+                counts[target_position] = count + previous_count + 1
+                previous_position = target_position
+            if remaining:
+                count += index.get(
+                    ("count", parent_uri, offset, None),
+                    lambda: sum([self.objects_within([r["uri"] for r in results_page]), len(results_page)]))
+                count += 1
+        return counts
@@ -1,9 +1,9 @@
 from requests.exceptions import ConnectionError
 
 from .helpers import (ArchivesSpaceHelper, MissingArchivalObjectError,
-                      add_group, closest_creators, closest_parent_value,
-                      combine_references, handle_cartographer_reference,
-                      indicator_to_integer)
+                      add_group, arrangement_maps, closest_creators,
+                      closest_parent_value, combine_references,
+                      handle_cartographer_reference, indicator_to_integer)
 
 
 class MergeError(Exception):
@@ -13,9 +13,9 @@ class MergeError(Exception):
 class BaseMerger:
     """Base merger class."""
 
-    def __init__(self, clients):
+    def __init__(self, clients, cache=None):
         try:
-            self.aspace_helper = ArchivesSpaceHelper(clients["aspace"])
+            self.aspace_helper = ArchivesSpaceHelper(clients["aspace"], cache)
             self.cartographer_client = clients.get("cartographer")
         except Exception as e:
             raise MergeError(e)
@@ -37,6 +37,10 @@ class BaseMerger:
         except Exception as e:
             raise MergeError(f"Error merging {identifier}: {e}")
 
+    def prepare(self, objects):
+        """Looks up data shared by a page of objects before they are merged."""
+        pass
+
     def get_identifier(self, object):
         """Returns the identifier for the object."""
         try:
@@ -49,7 +53,7 @@ class BaseMerger:
         pass
 
     def combine_data(self, object, additional_data):
-        return add_group(object, self.aspace_helper.aspace.client)
+        return add_group(object, self.aspace_helper.aspace.client, self.aspace_helper.cache)
 
     def get_target_object_type(self, data):
         """Returns object type.
@@ -63,6 +67,9 @@ class BaseMerger:
         return data.get("jsonmodel_type")
 
     def arrangement_map_component_by_uri(self, uri):
+        return arrangement_maps.get(uri, lambda: self.find_arrangement_map_component(uri))
+
+    def find_arrangement_map_component(self, uri):
         resp = self.cartographer_client.get("/api/find-by-uri/", params={"uri": uri})
         resp.raise_for_status()
         json_data = resp.json()
@@ -70,9 +77,32 @@ class BaseMerger:
             return json_data["results"][0]
         return None
 
+    def arrangement_map_objects_before(self, component):
+        """Returns a count of objects before an arrangement map component.
+
+        Counts include archival objects in previous resources, so they are
+        requested once per run rather than being kept with arrangement maps.
+        """
+        return self.aspace_helper.cached(
+            ("objects_before", component["ref"]),
+            lambda: self.cartographer_client.get(f"{component['ref']}objects_before/").json().get("count", 0))
+
 
 class ArchivalObjectMerger(BaseMerger):
 
+    def prepare(self, objects):
+        """Caches child counts used to determine target object types, and
+        counts of objects before siblings used to calculate positions."""
+        self.aspace_helper.child_counts(objects)
+        siblings = {}
+        for obj in objects:
+            siblings.setdefault((obj["resource"]["ref"], obj.get("parent", {}).get("ref")), []).append(obj)
+        for (resource_uri, parent_uri), nodes in siblings.items():
+            if len(nodes) > 1:
+                index = self.aspace_helper.tree_index(
+                    resource_uri, nodes[0]["ancestors"][-1].get("_resolved", {}).get("lock_version"))
+                self.aspace_helper.sibling_objects_before(index, nodes, resource_uri, parent_uri)
+
     def get_additional_data(self, object, object_type):
         """Fetches additional data from ArchivesSpace and Cartographer.
 
@@ -162,34 +192,47 @@ class ArchivalObjectMerger(BaseMerger):
 
         This is calculated based on the sum of previous ancestors, previous top
         ancestors in ArchivesSpace, and previous ancestors in Cartographer.
+        Data about the resource tree is cached in a tree index, which is shared
+        by all objects in the same resource during a run.
         """
+        resource_uri = object["resource"]["ref"]
+        index = self.aspace_helper.tree_index(
+            resource_uri, object["ancestors"][-1].get("_resolved", {}).get("lock_version"))
 
-        previous_ancestors_count = 0
-        for idx, ancestor in enumerate(object["ancestors"]):
-            target_node = object["ancestors"][idx - 1] if idx > 0 else object
-            if "resource" not in ancestor["ref"]:
-                tree_node = self.aspace_helper.tree_node(object["resource"]["ref"], ancestor["ref"])
-                previous_ancestors_count += self.aspace_helper.objects_before(
-                    target_node,
-                    tree_node,
-                    object["resource"]["ref"],
-                    ancestor["ref"])
-
-        target_node = object["ancestors"][-2] if len(object["ancestors"]) > 1 else object
-        tree_root = self.aspace_helper.tree_root(object["resource"]["ref"])
-        previous_top_ancestors_count = self.aspace_helper.objects_before(
-            target_node,
-            tree_root,
-            object["resource"]["ref"])
+        aspace_count = self.node_position(index, resource_uri, object, object["ancestors"])
 
         cartographer_count = 0
         if self.cartographer_client:
-            result = self.arrangement_map_component_by_uri(object["resource"]["ref"])
-            if result:
-                resp = self.cartographer_client.get(f"{result['ref']}objects_before/").json()
-                cartographer_count = resp.get("count", 0)
+            cartographer_count = index.get("cartographer_count", lambda: self.cartographer_objects_before(resource_uri))
+
+        return sum([aspace_count, cartographer_count])
+
+    def node_position(self, index, resource_uri, node, ancestors):
+        """Gets the position of a tree node within its resource.
 
-        return sum([previous_ancestors_count, previous_top_ancestors_count, cartographer_count])
+        This is the position of the node's parent plus the count of objects
+        before the node within that parent. Positions are cached in the tree
+        index by the URIs and positions of the node and its ancestors, so the
+        positions of parents are carried down to their children.
+        """
+        parent = ancestors[0]
+        path = tuple((n.get("uri", n.get("ref")), n["position"] if "position" in n else n["_resolved"]["position"])
+                     for n in [node] + ancestors[:-1])
+
+        def calculate():
+            if "resource" in parent["ref"]:
+                return self.aspace_helper.objects_before(index, node, resource_uri)
+            return sum([
+                self.node_position(index, resource_uri, parent, ancestors[1:]),
+                self.aspace_helper.objects_before(index, node, resource_uri, parent["ref"])])
+        return index.get(("position", path), calculate)
+
+    def cartographer_objects_before(self, resource_uri):
+        """Gets a count of objects before a resource in Cartographer."""
+        result = self.arrangement_map_component_by_uri(resource_uri)
+        if result:
+            return self.arrangement_map_objects_before(result)
+        return 0
 
     def get_archivesspace_data(self, object, object_type):
         """Gets dates, languages, and extent from archival object's
@@ -234,7 +277,7 @@ class ArrangementMapMerger(BaseMerger):
 
     def get_additional_data(self, object, object_type):
         """Fetches the ArchivesSpace resource record referenced by the
-        ArrangementMapComponent.
+        ArrangementMapComponent, unless it has already been fetched.
 
         Args:
             object (dict): source object (an ArrangementMapComponent).
@@ -243,6 +286,8 @@ class ArrangementMapMerger(BaseMerger):
         Returns:
             dict: a dictionary of data to be merged.
         """
+        if object.get("_resolved"):
+            return object["_resolved"]
         return self.aspace_helper.aspace.client.get(
             object["archivesspace_uri"],
             params={"resolve": ["subjects", "linked_agents"]}).json()
@@ -251,7 +296,7 @@ class ArrangementMapMerger(BaseMerger):
         """Adds Cartographer ancestors to ArchivesSpace resource record."""
         additional_data["ancestors"] = [handle_cartographer_reference(a) for a in object.get("ancestors", [])]
         additional_data["position"] = object["order"]
-        additional_data = add_group(additional_data, self.aspace_helper.aspace.client)
+        additional_data = add_group(additional_data, self.aspace_helper.aspace.client, self.aspace_helper.cache)
         return combine_references(additional_data)
 
 
@@ -280,8 +325,7 @@ class ResourceMerger(BaseMerger):
         data = {"ancestors": []}
         result = self.arrangement_map_component_by_uri(object["uri"])
         if result:
-            resp = self.cartographer_client.get(f"{result['ref']}objects_before/").json()
-            data["order"] = resp.get("count", 0)
+            data["order"] = self.arrangement_map_objects_before(result)
             for a in result.get("ancestors", []):
                 data["ancestors"].append(handle_cartographer_reference(a))
         return data
@@ -1,13 +1,19 @@
 import json
 import os
-from unittest.mock import patch
+import threading
+import time
+from unittest.mock import MagicMock, patch
 
 import vcr
 from django.test import TestCase
 from rest_framework.test import APIRequestFactory
 
 from fetcher.fetchers import BaseDataFetcher
+from fetcher.models import ArrangementMapSnapshot
+from pisces import settings
 
+from .helpers import (ArchivesSpaceHelper, RunCache, TreeIndex, add_group,
+                      arrangement_maps)
 from .mergers import (AgentMerger, ArchivalObjectMerger, ArrangementMapMerger,
                       ResourceMerger, SubjectMerger)
 
@@ -142,9 +148,10 @@ class MergerTest(TestCase):
                     "/repositories/2/archival_objects/482045": 36134,
                     "/repositories/2/archival_objects/487369": 40707,
                     "/repositories/2/archival_objects/892776": 134904}
-        with merger_vcr.use_cassette("position.json"):
+        cache = RunCache(settings.RUN_CACHE_SIZE)
+        with merger_vcr.use_cassette("position.json") as cassette:
             clients = BaseDataFetcher().instantiate_clients()
-            merger = ArchivalObjectMerger(clients)
+            merger = ArchivalObjectMerger(clients, cache)
             fixture_dir = os.path.join("fixtures", "merger", "position")
             for f in os.listdir(fixture_dir):
                 with open(os.path.join(fixture_dir, f), "r") as json_file:
@@ -153,3 +160,165 @@ class MergerTest(TestCase):
                     self.assertEqual(
                         collection_index, EXPECTED[source_data['uri']],
                         f"Expected {EXPECTED[source_data['uri']]}, got {collection_index}")
+            play_count = cassette.play_count
+            hits = cache.hits
+            for f in os.listdir(fixture_dir):
+                with open(os.path.join(fixture_dir, f), "r") as json_file:
+                    source_data = json.load(json_file)
+                    self.assertEqual(merger.get_position(source_data), EXPECTED[source_data['uri']])
+            self.assertEqual(cassette.play_count, play_count, "Positions were not calculated from tree indexes")
+            self.assertGreater(cache.hits, hits)
+        fetch = MagicMock(return_value={})
+        ArchivesSpaceHelper(MagicMock(), RunCache(settings.RUN_CACHE_SIZE)).tree_index(source_data["resource"]["ref"]).get(("node", None), fetch)
+        fetch.assert_called_once()
+
+    def test_child_counts(self):
+        """Asserts that target object types for a page are determined from cached child counts."""
+        with merger_vcr.use_cassette("position.json") as cassette:
+            clients = BaseDataFetcher().instantiate_clients()
+            merger = ArchivalObjectMerger(clients, RunCache(settings.RUN_CACHE_SIZE))
+            fixture_dir = os.path.join("fixtures", "merger", "position")
+            page = []
+            for f in os.listdir(fixture_dir):
+                with open(os.path.join(fixture_dir, f), "r") as json_file:
+                    page.append(json.load(json_file))
+            merger.prepare(page)
+            play_count = cassette.play_count
+            for obj in page:
+                self.assertEqual(merger.get_target_object_type(obj), "archival_object")
+            self.assertEqual(cassette.play_count, play_count, "Target object types were not determined from child counts")
+
+    def test_arrangement_maps(self):
+        """Asserts that arrangement map components are read from a stored snapshot
+        in which only changed components are reloaded."""
+        def component(component_id, map_id, parent=None, title="Component"):
+            return {
+                "id": component_id,
+                "ref": "/api/components/{}/".format(component_id),
+                "title": title,
+                "map": map_id,
+                "parent": parent,
+                "order": component_id,
+                "level": "collection",
+                "archivesspace_uri": "/repositories/2/resources/{}".format(component_id),
+                "ancestors": []}
+        responses = {
+            "/api/components/1/": component(1, 1),
+            "/api/components/2/": dict(component(2, 1, 1), ancestors=[{"title": "Component", "ref": "/api/components/1/", "archivesspace_uri": "/repositories/2/resources/1", "level": "collection", "order": 1}]),
+            "/api/components/3/": component(3, 2),
+            "/api/components/2/objects_before/": {"count": 12}}
+        feeds = {"modified": [], "deleted": []}
+
+        def get_paged(url, params=None):
+            if url == "/api/delete-feed/":
+                return feeds["deleted"]
+            return feeds["modified"] if params else [{"id": 1}, {"id": 2}, {"id": 3}]
+        client = MagicMock()
+        client.get_paged.side_effect = get_paged
+        client.get.side_effect = lambda url, **kwargs: MagicMock(json=lambda: responses[url])
+        arrangement_maps.invalidate()
+        arrangement_maps.refresh(client)
+        self.assertEqual(client.get.call_count, 3)
+        self.assertEqual(ArrangementMapSnapshot.objects.get().components, arrangement_maps.components)
+        merger = ResourceMerger({"aspace": MagicMock(), "cartographer": client}, RunCache(settings.RUN_CACHE_SIZE))
+        for _ in range(2):
+            data = merger.get_cartographer_data({"uri": "/repositories/2/resources/2"})
+            self.assertEqual(data["order"], 12)
+            self.assertEqual(data["ancestors"][0]["ref"], "/repositories/2/resources/1")
+        self.assertEqual(merger.get_cartographer_data({"uri": "/repositories/2/resources/4"}), {"ancestors": []})
+        self.assertEqual(client.get.call_count, 4)
+
+        arrangement_maps.invalidate()
+        arrangement_maps.refresh(client)
+        self.assertEqual(client.get.call_count, 4)
+        self.assertEqual(len(arrangement_maps.components), 3)
+        feeds["modified"] = [{"id": 1}]
+        feeds["deleted"] = [{"ref": "/api/components/3/", "archivesspace_uri": "/repositories/2/resources/3"}]
+        responses["/api/components/1/"] = component(1, 1, title="Renamed")
+        arrangement_maps.refresh(client)
+        self.assertEqual([c.args[0] for c in client.get.call_args_list[4:]], ["/api/components/1/"])
+        self.assertEqual(arrangement_maps.get("/repositories/2/resources/2", MagicMock())["ancestors"][0]["title"], "Renamed")
+        self.assertIsNone(arrangement_maps.get("/repositories/2/resources/3", MagicMock()))
+        self.assertEqual(ArrangementMapSnapshot.objects.get().loaded, arrangement_maps.loaded)
+        arrangement_maps.invalidate()
+
+    def test_group_cache(self):
+        """Asserts that groups are only created once for each top ancestor."""
+        client = MagicMock()
+        client.get.return_value.json.side_effect = lambda: {
+            "uri": "/repositories/2/resources/1",
+            "title": "Collection",
+            "dates": [{"expression": "1950-1990"}],
+            "linked_agents": [{"ref": "/agents/people/1", "role": "creator", "_resolved": {"agent_type": "agent_person", "title": "Person", "dates": []}}]}
+        cache = RunCache(settings.RUN_CACHE_SIZE)
+        objects = [{"jsonmodel_type": "archival_object", "ancestors": [{"ref": "/repositories/2/resources/1"}]} for _ in range(3)]
+        for obj in objects:
+            add_group(obj, client, cache)
+        self.assertEqual(client.get.call_count, 1)
+        self.assertEqual(objects[0]["group"]["identifier"], "/repositories/2/resources/1")
+        self.assertEqual(objects[0]["group"]["creators"][0]["title"], "Person")
+        self.assertEqual(objects[0]["group"], objects[2]["group"])
+        self.assertIsNot(objects[0]["group"], objects[2]["group"])
+
+    def test_sibling_objects_before(self):
+        """Asserts that counts for siblings match counts calculated separately."""
+        descendants = {"/repositories/2/archival_objects/{}".format(i): i % 3 for i in range(10)}
+
+        def get(url):
+            if "waypoint" in url:
+                offset = int(url.split("offset=")[1].split("&")[0])
+                return MagicMock(json=lambda: [{"uri": "/repositories/2/archival_objects/{}".format(i), "position": i}
+                                               for i in range(offset * 4, min(10, (offset + 1) * 4))])
+            if url.startswith("search"):
+                uris = url.split("}")[1].split(" AND")[0].split(",")
+                return MagicMock(json=lambda: {"total_hits": sum(descendants[u] for u in uris)})
+            return MagicMock(json=lambda: {"waypoints": 3, "waypoint_size": 4})
+        aspace = MagicMock()
+        aspace.client.get.side_effect = get
+        helper = ArchivesSpaceHelper(aspace)
+        nodes = [{"position": p} for p in [9, 1, 2, 6]]
+        counts = helper.sibling_objects_before(TreeIndex(), nodes, "/repositories/2/resources/1", "/repositories/2/archival_objects/100")
+        searches = [c.args[0] for c in aspace.client.get.call_args_list if c.args[0].startswith("search")]
+        self.assertEqual(len(searches), 6)
+        for node in nodes:
+            self.assertEqual(
+                counts[node["position"]],
+                helper.objects_before(TreeIndex(), node, "/repositories/2/resources/1", "/repositories/2/archival_objects/100"))
+
+        aspace.client.get.reset_mock()
+        cache = RunCache(settings.RUN_CACHE_SIZE)
+        helper = ArchivesSpaceHelper(aspace, cache)
+        for _ in range(2):
+            self.assertEqual(
+                helper.sibling_objects_before(helper.tree_index("/repositories/2/resources/1"), nodes, "/repositories/2/resources/1", "/repositories/2/archival_objects/100"),
+                counts)
+        requests = [c.args[0] for c in aspace.client.get.call_args_list]
+        self.assertEqual(len([r for r in requests if "waypoint" in r]), 3)
+        tree_keys = [key[3] for key in cache.values if key[0] == "tree_index"]
+        self.assertEqual(len([k for k in tree_keys if k[0] in ["node", "page"]]), len([r for r in requests if not r.startswith("search")]))
+        self.assertGreater(cache.hits, 0)
+
+    def test_run_cache(self):
+        """Asserts that cached values are shared, bounded and counted."""
+        cache = RunCache(2)
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            time.sleep(0.05)
+            return key.upper()
+
+        threads = [threading.Thread(target=cache.get, args=("a", lambda: fetch("a"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, ["a"])
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+        self.assertEqual(cache.get("b", lambda: fetch("b")), "B")
+        self.assertEqual(cache.get("a", lambda: fetch("a")), "A")
+        self.assertEqual(cache.get("c", lambda: fetch("c")), "C")
+        self.assertEqual(cache.get("b", lambda: fetch("b")), "B")
+        self.assertEqual(calls, ["a", "b", "c", "b"])
+        self.assertEqual((cache.hits, cache.misses), (5, 4))
@@ -136,12 +136,8 @@ REST_FRAMEWORK = {
 
 # Django cron settings
 CRON_CLASSES = [
-    "fetcher.cron.DeletedArchivesSpaceArchivalObjects",
-    "fetcher.cron.DeletedArchivesSpaceFamilies",
-    "fetcher.cron.DeletedArchivesSpaceOrganizations",
-    "fetcher.cron.DeletedArchivesSpacePeople",
-    "fetcher.cron.DeletedArchivesSpaceResources",
-    "fetcher.cron.DeletedArchivesSpaceSubjects",
+    "fetcher.cron.DeletedArchivesSpaceObjects",
+    "fetcher.cron.ProcessQueuedJobs",
     "fetcher.cron.UpdatedArchivesSpaceArchivalObjects",
     "fetcher.cron.UpdatedArchivesSpaceFamilies",
     "fetcher.cron.UpdatedArchivesSpaceOrganizations",
@@ -152,21 +148,51 @@ CRON_CLASSES = [
 ]
 DJANGO_CRON_LOCK_BACKEND = "django_cron.backends.lock.file.FileLock"
 DJANGO_CRON_LOCKFILE_PATH = config.DJANGO_CRON_LOCKFILE_PATH
+CRON_LEASE = config.CRON_LEASE
 
 ARCHIVESSPACE = {
     "baseurl": config.AS_BASEURL,
     "username": config.AS_USERNAME,
     "password": config.AS_PASSWORD,
     "repo": config.AS_REPO_ID,
+    "session_expiry": config.AS_SESSION_EXPIRY,
+    "concurrency_min": config.AS_CONCURRENCY_MIN,
+    "concurrency_max": config.AS_CONCURRENCY_MAX,
+    "latency_tolerance": config.AS_LATENCY_TOLERANCE,
+    "bulkhead_size": config.AS_BULKHEAD_SIZE,
+    "reference_cache": config.AS_REFERENCE_CACHE,
 }
 
 CARTOGRAPHER = {
     "cartographer_use": config.CARTOGRAPHER_USE,
     "baseurl": config.CARTOGRAPHER_BASEURL,
     "health_check_path": config.CARTOGRAPHER_HEALTH_CHECK_PATH,
+    "concurrency": config.CARTOGRAPHER_CONCURRENCY,
+    "bulkhead_size": config.CARTOGRAPHER_BULKHEAD_SIZE,
+    "map_merge": config.CARTOGRAPHER_MAP_MERGE,
+}
+
+UPSTREAM = {
+    "timeout": config.UPSTREAM_TIMEOUT,
+    "retries": config.UPSTREAM_RETRIES,
+    "backoff": config.UPSTREAM_BACKOFF,
+    "failure_threshold": config.UPSTREAM_FAILURE_THRESHOLD,
+    "reset_timeout": config.UPSTREAM_RESET_TIMEOUT,
+}
+
+TRANSFORM_PROCESSES = config.TRANSFORM_PROCESSES
+RUN_CACHE_SIZE = config.RUN_CACHE_SIZE
+SHIFT_POSITIONS = config.SHIFT_POSITIONS
+COMPILED_MAPPINGS = config.COMPILED_MAPPINGS
+CONNECTION_POOL_SIZE = config.CONNECTION_POOL_SIZE
+
+JOB_QUEUE = {
+    "queue_use": config.QUEUE_USE,
+    "claim_size": config.QUEUE_CLAIM_SIZE,
+    "lease": config.QUEUE_LEASE,
+    "max_attempts": config.QUEUE_MAX_ATTEMPTS,
 }
 
-CHUNK_SIZE = config.CHUNK_SIZE
 INDEX_DELETE_URL = config.INDEX_DELETE_URL
 
 # Email settings
@@ -182,7 +208,12 @@ MOVING_IMAGE_REFS = config.MOVING_IMAGE_REFS
 AUDIO_REFS = config.AUDIO_REFS
 PHOTOGRAPH_REFS = config.PHOTOGRAPH_REFS
 
-# Base URL for online assets
+# Base URL and lookup of online assets
 ASSET_BASEURL = config.ASSET_BASEURL
+ASSET_LOOKUP_ASYNC = config.ASSET_LOOKUP_ASYNC
+ASSET_CACHE_TTL = config.ASSET_CACHE_TTL
+ASSET_MISSING_CACHE_TTL = config.ASSET_MISSING_CACHE_TTL
+ASSET_MANIFEST = config.ASSET_MANIFEST
+ASSET_MANIFEST_TTL = config.ASSET_MANIFEST_TTL
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,142 @@
+"""Availability of online assets.
+
+If `ASSET_MANIFEST` is set, the identifiers of available assets are loaded
+from a manifest into an index, and availability is looked up in the index.
+The manifest is checked for changes at most once every `ASSET_MANIFEST_TTL`
+seconds, and only reloaded if it has changed.
+
+Otherwise, results of looking up whether assets are available are cached, so
+that an identifier is looked up at most once every `ASSET_CACHE_TTL` seconds
+while its asset is available, and once every `ASSET_MISSING_CACHE_TTL` seconds
+while it is missing.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from pisces import settings
+
+
+class OnlineAssetIndex:
+    """Identifiers of available online assets, loaded from a manifest.
+
+    The manifest lists one identifier per line. Manifests on a server are
+    requested conditionally, and local manifests are only read when they have
+    been modified, so an unchanged manifest is not loaded again.
+
+    Args:
+        manifest (str): URL or path of the manifest.
+        ttl (int): number of seconds between checks for changes to the manifest.
+    """
+
+    def __init__(self, manifest, ttl):
+        self.manifest = manifest
+        self.ttl = ttl
+        self.identifiers = None
+        self.checked = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Reloads the manifest if it has changed since it was last checked.
+
+        If the manifest cannot be loaded, the identifiers already loaded
+        continue to be used.
+        """
+        if not self.manifest:
+            return
+        with self.lock:
+            if self.checked and time.monotonic() - self.checked < self.ttl:
+                return
+            try:
+                if self.manifest.startswith(("http://", "https://")):
+                    self.load_url()
+                else:
+                    self.load_file()
+            except Exception as e:
+                print("Error loading asset manifest: {}".format(e))
+            self.checked = time.monotonic()
+
+    def load_url(self):
+        headers = {}
+        if self.version:
+            etag, last_modified = self.version
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        resp = requests.get(self.manifest, headers=headers)
+        if resp.status_code == 304:
+            return
+        resp.raise_for_status()
+        self.identifiers = self.parse(resp.text)
+        self.version = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+    def load_file(self):
+        stat = os.stat(self.manifest)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.version:
+            return
+        with open(self.manifest, "r") as mf:
+            self.identifiers = self.parse(mf.read())
+        self.version = version
+
+    def parse(self, text):
+        return frozenset(line.strip() for line in text.splitlines() if line.strip())
+
+    def get(self, identifier):
+        """Returns True or False if the manifest has been loaded, otherwise None."""
+        identifiers = self.identifiers
+        if identifiers is None:
+            return None
+        return identifier in identifiers
+
+
+class OnlineAssetCache:
+    """Least recently used cache of whether assets are available, keyed by identifier.
+
+    Args:
+        ttl (int): number of seconds an available asset is cached for.
+        missing_ttl (int): number of seconds a missing asset is cached for.
+        max_size (int): maximum number of identifiers to keep.
+    """
+
+    def __init__(self, ttl, missing_ttl, max_size=100000):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, identifier):
+        """Returns True or False if it is known whether an asset is available,
+        otherwise None."""
+        with self.lock:
+            entry = self.entries.get(identifier)
+            if not entry:
+                return None
+            available, expires = entry
+            if expires < time.monotonic():
+                del self.entries[identifier]
+                return None
+            self.entries.move_to_end(identifier)
+            return available
+
+    def set(self, identifier, available):
+        with self.lock:
+            self.entries[identifier] = (available, time.monotonic() + (self.ttl if available else self.missing_ttl))
+            self.entries.move_to_end(identifier)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+asset_index = OnlineAssetIndex(settings.ASSET_MANIFEST, settings.ASSET_MANIFEST_TTL)
+online_assets = OnlineAssetCache(settings.ASSET_CACHE_TTL, settings.ASSET_MISSING_CACHE_TTL)
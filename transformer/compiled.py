@@ -0,0 +1,152 @@
+"""Compiled mappings.
+
+Odin applies a mapping by interpreting each of its rules in turn for every
+object. Mappings which use `CompiledMapping` are instead applied by a function
+generated from their rules the first time they are used in a process, which
+reads source fields, calls actions and sets fields on the target object
+directly. Generated functions behave the same as Odin, and mappings which
+cannot be compiled are applied by Odin.
+"""
+
+import keyword
+import threading
+from collections.abc import Iterable
+
+from odin.exceptions import MappingExecutionError
+from odin.mapping import MappingBase
+from odin.resources import ResourceBase
+from odin.utils import getmeta
+
+from pisces import settings
+
+compiled = {}
+compiled_lock = threading.Lock()
+
+
+class CompiledMapping:
+    """Mixin for mappings which are applied by a compiled function when
+    COMPILED_MAPPINGS is set."""
+
+    @classmethod
+    def apply(cls, source_obj, context=None, allow_subclass=False, mapping_result=None):
+        if settings.COMPILED_MAPPINGS and source_obj.__class__ is cls.from_obj:
+            convert = get_compiled(cls)
+            if convert:
+                context = context or {}
+                context.setdefault("_loop_idx", [])
+                return convert(source_obj, context)
+        return super().apply(source_obj, context, allow_subclass, mapping_result)
+
+
+def get_compiled(mapping):
+    """Returns the compiled function for a mapping, compiling it if necessary."""
+    try:
+        return compiled[mapping]
+    except KeyError:
+        with compiled_lock:
+            if mapping not in compiled:
+                compiled[mapping] = compile_mapping(mapping)
+            return compiled[mapping]
+
+
+def is_name(value):
+    return isinstance(value, str) and value.isidentifier() and not keyword.iskeyword(value)
+
+
+def rule_values(rule, to_values):
+    """Returns field values for the result of a rule, as Odin does."""
+    if len(rule.to_field) != len(to_values):
+        raise MappingExecutionError("Rule expects {} fields ({} returned) applying rule {}".format(
+            len(rule.to_field), len(to_values), rule))
+    return {f: v for f, v in zip(rule.to_field, to_values) if not (rule.skip_if_none and v is None)}
+
+
+def compile_rule(idx, rule):
+    """Returns lines of code which apply a mapping rule, or None if the rule
+    cannot be compiled."""
+    from_fields = rule.from_field or ()
+    if not all(is_name(f) for f in from_fields + rule.to_field):
+        return None
+    args = ["source.{}".format(f) for f in from_fields]
+
+    def assign(to_field, value):
+        if rule.skip_if_none:
+            return ["if {} is not None:".format(value), "    values[{!r}] = {}".format(to_field, value)]
+        return ["values[{!r}] = {}".format(to_field, value)]
+
+    if rule.action is None:
+        if len(from_fields) != len(rule.to_field):
+            return None
+        return [line for f, arg in zip(rule.to_field, args) for line in assign(f, arg)]
+    if isinstance(rule.action, str):
+        if not is_name(rule.action):
+            return None
+        action = "self.{}".format(rule.action)
+    else:
+        action = "actions[{}]".format(idx)
+    lines = [
+        "try:",
+        "    value = {}({})".format(action, ", ".join((["self"] if rule.bind else []) + args)),
+        "except TypeError as ex:",
+        "    raise MappingExecutionError('{{}} applying rule {{}}'.format(ex, rules[{}]))".format(idx)]
+    if rule.to_list:
+        lines += ["if isinstance(value, Iterable):"]
+        lines += ["    " + line for line in assign(rule.to_field[0], "list(value)")]
+        lines += ["else:", "    values.update(rule_values(rules[{}], value))".format(idx)]
+    elif len(rule.to_field) == 1:
+        lines += ["if isinstance(value, (list, tuple)):", "    values.update(rule_values(rules[{}], value))".format(idx), "else:"]
+        lines += ["    " + line for line in assign(rule.to_field[0], "value")]
+    else:
+        lines += ["values.update(rule_values(rules[{}], value if isinstance(value, (list, tuple)) else (value,)))".format(idx)]
+    return lines
+
+
+def compile_mapping(mapping):
+    """Generates a function which applies a mapping to a source object.
+
+    Returns:
+        function: takes a source object and a context and returns the target
+            object, or None if the mapping cannot be compiled.
+    """
+    if mapping.convert is not MappingBase.convert or mapping.create_object is not MappingBase.create_object:
+        return None
+    rules = list(mapping._mapping_rules)
+    lines = [
+        "def convert(source, context):",
+        "    self = new(mapping)",
+        "    self.source = source",
+        "    self.context = context",
+        "    self.ignore_not_provided = False",
+        "    values = {}"]
+    for idx, rule in enumerate(rules):
+        rule_lines = compile_rule(idx, rule)
+        if rule_lines is None:
+            return None
+        lines += ["    " + line for line in rule_lines]
+
+    fields = getmeta(mapping.to_obj).init_fields
+    if mapping.to_obj.__init__ is ResourceBase.__init__ and all(is_name(f.attname) for f in fields):
+        always = set(f for rule in rules if not rule.skip_if_none for f in rule.to_field)
+        lines.append("    obj = new(mapping.to_obj)")
+        for idx, field in enumerate(fields):
+            if field.attname in always:
+                value = "values[{!r}]".format(field.attname)
+            else:
+                value = "values[{0!r}] if {0!r} in values else fields[{1}].get_default()".format(field.attname, idx)
+            lines.append("    obj.{} = {}".format(field.attname, value))
+        lines.append("    return obj")
+    else:
+        lines.append("    return mapping.to_obj(**values)")
+
+    namespace = {
+        "mapping": mapping,
+        "rules": rules,
+        "actions": [rule.action for rule in rules],
+        "fields": fields,
+        "new": object.__new__,
+        "rule_values": rule_values,
+        "Iterable": Iterable,
+        "MappingExecutionError": MappingExecutionError,
+    }
+    exec(compile("\n".join(lines), "<compiled {}>".format(mapping.__name__), "exec"), namespace)
+    return namespace["convert"]
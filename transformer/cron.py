@@ -1,5 +1,6 @@
 from datetime import datetime
 
+from django.utils import timezone
 from django_cron import CronJobBase, Schedule
 
 from .mappings import has_online_asset
@@ -13,11 +14,15 @@ class CheckMissingOnlineAssets(CronJobBase):
 
     def do(self):
         print("Checking for recently added assets at {}".format(datetime.now()))
+        discovered = []
         for object in DataObject.objects.filter(object_type__in=["collection", "object"], online_pending=True).iterator():
             if has_online_asset(object.es_id):
                 object.data["online"] = True
                 object.online_pending = False
                 object.indexed = False
-                object.save()
+                object.last_modified = timezone.now()
+                discovered.append(object)
                 print("Online assets discovered for {}".format(object.es_id))
+        DataObject.objects.bulk_update(
+            discovered, ["data", "online_pending", "indexed", "last_modified"], batch_size=1000)
         print("Finished checking for recently added assets at {}\n".format(datetime.now()))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from transformer.positions import record_positions
+
+
+class Command(BaseCommand):
+    help = "Records the positions of saved collections and objects, so that they can be shifted when SHIFT_POSITIONS is True."
+
+    def handle(self, *args, **options):
+        self.stdout.write("Recorded {} positions".format(record_positions()))
@@ -5,10 +5,13 @@ import xml.etree.ElementTree as ET
 import odin
 import requests
 from iso639 import languages
+from odin.codecs import dict_codec
 
 from fetcher.helpers import identifier_from_uri
 from pisces import settings
 
+from .assets import asset_index
+from .compiled import CompiledMapping
 from .resources.configs import NOTE_TYPE_CHOICES, NOTE_TYPE_CHOICES_TRANSFORM
 from .resources.rac import (Agent, AgentReference, Collection, Date, Extent,
                             ExternalIdentifier, Group, Language, Note, Object,
@@ -29,15 +32,19 @@ def convert_dates(value):
     migrated to AS 3.0."""
     if len(value) and value[0]["jsonmodel_type"] == "structured_date_label":
         return SourceStructuredDateToDate.apply(
-            [odin.codecs.json_codec.loads(json.dumps(v), resource=SourceStructuredDate) for v in value]
+            [dict_codec.load(v, resource=SourceStructuredDate) for v in value]
         )
     else:
         return SourceDateToDate.apply(
-            [odin.codecs.json_codec.loads(json.dumps(v), resource=SourceDate) for v in value]
+            [dict_codec.load(v, resource=SourceDate) for v in value]
         )
 
 
 def has_online_asset(identifier):
+    asset_index.refresh()
+    available = asset_index.get(identifier)
+    if available is not None:
+        return available
     req = requests.head("{}/pdfs/{}".format(settings.ASSET_BASEURL.rstrip("/"), identifier))
     return True if req.status_code == 200 else False
 
@@ -97,7 +104,7 @@ def transform_group(value, prefix):
     return group
 
 
-class SourceRefToTermReference(odin.Mapping):
+class SourceRefToTermReference(CompiledMapping, odin.Mapping):
     """Maps SourceRef to TermReference object."""
     from_obj = SourceRef
     to_obj = TermReference
@@ -119,7 +126,7 @@ class SourceRefToTermReference(odin.Mapping):
         return identifier_from_uri(value)
 
 
-class SourceAncestorToRecordReference(odin.Mapping):
+class SourceAncestorToRecordReference(CompiledMapping, odin.Mapping):
     """Maps SourceAncestor to RecordReference object."""
     from_obj = SourceAncestor
     to_obj = RecordReference
@@ -146,7 +153,7 @@ class SourceAncestorToRecordReference(odin.Mapping):
         return identifier_from_uri(value)
 
 
-class SourceLinkedAgentToAgentReference(odin.Mapping):
+class SourceLinkedAgentToAgentReference(CompiledMapping, odin.Mapping):
     """Maps SourceLinkedAgent to AgentReference object."""
     from_obj = SourceLinkedAgent
     to_obj = AgentReference
@@ -178,7 +185,7 @@ class SourceLinkedAgentToAgentReference(odin.Mapping):
         return identifier_from_uri(value)
 
 
-class SourceStructuredDateToDate(odin.Mapping):
+class SourceStructuredDateToDate(CompiledMapping, odin.Mapping):
     """Maps SourceStructuredDate to Date object."""
     from_obj = SourceStructuredDate
     to_obj = Date
@@ -214,7 +221,7 @@ class SourceStructuredDateToDate(odin.Mapping):
             return "{}-{}".format(begin, end)
 
 
-class SourceDateToDate(odin.Mapping):
+class SourceDateToDate(CompiledMapping, odin.Mapping):
     """Maps SourceDate to Date object."""
     from_obj = SourceDate
     to_obj = Date
@@ -234,7 +241,7 @@ class SourceDateToDate(odin.Mapping):
         return value
 
 
-class SourceExtentToExtent(odin.Mapping):
+class SourceExtentToExtent(CompiledMapping, odin.Mapping):
     """Maps SourceExtent to Extent object."""
     from_obj = SourceExtent
     to_obj = Extent
@@ -245,7 +252,7 @@ class SourceExtentToExtent(odin.Mapping):
     )
 
 
-class SourceGroupToGroup(odin.Mapping):
+class SourceGroupToGroup(CompiledMapping, odin.Mapping):
     """Maps SourceGroup to Group.
 
     Since the structure of these object is exactly the same, all field mappings
@@ -271,7 +278,7 @@ class SourceGroupToGroup(odin.Mapping):
         return convert_dates(value)
 
 
-class SourceNoteToNote(odin.Mapping):
+class SourceNoteToNote(CompiledMapping, odin.Mapping):
     """Maps SourceNote to Note object."""
     from_obj = SourceNote
     to_obj = Note
@@ -346,7 +353,7 @@ class SourceNoteToNote(odin.Mapping):
         return Subnote(type="definedlist", items=items_list)
 
 
-class SourceResourceToCollection(odin.Mapping):
+class SourceResourceToCollection(CompiledMapping, odin.Mapping):
     """Maps SourceResource to Collection object."""
     from_obj = SourceResource
     to_obj = Collection
@@ -408,7 +415,7 @@ class SourceResourceToCollection(odin.Mapping):
         return identifier_from_uri(value[0].ref) if value else None
 
 
-class SourceArchivalObjectToCollection(odin.Mapping):
+class SourceArchivalObjectToCollection(CompiledMapping, odin.Mapping):
     """Maps SourceArchivalObject to Collection object."""
     from_obj = SourceArchivalObject
     to_obj = Collection
@@ -462,6 +469,8 @@ class SourceArchivalObjectToCollection(odin.Mapping):
 
     @odin.map_field(from_field="instances", to_field="online")
     def online(self, value):
+        if "online" in self.context:
+            return self.context["online"]
         return has_online_instance(value, self.source.uri)
 
     @odin.map_field(from_field="group", to_field="group")
@@ -473,7 +482,7 @@ class SourceArchivalObjectToCollection(odin.Mapping):
         return identifier_from_uri(value[0].ref)
 
 
-class SourceArchivalObjectToObject(odin.Mapping):
+class SourceArchivalObjectToObject(CompiledMapping, odin.Mapping):
     """Maps SourceArchivalObject to Objects object."""
     from_obj = SourceArchivalObject
     to_obj = Object
@@ -525,6 +534,8 @@ class SourceArchivalObjectToObject(odin.Mapping):
 
     @odin.map_field(from_field="instances", to_field="online")
     def online(self, value):
+        if "online" in self.context:
+            return self.context["online"]
         return has_online_instance(value, self.source.uri)
 
     @odin.map_field(from_field="group", to_field="group")
@@ -536,7 +547,7 @@ class SourceArchivalObjectToObject(odin.Mapping):
         return identifier_from_uri(value[0].ref)
 
 
-class SourceSubjectToTerm(odin.Mapping):
+class SourceSubjectToTerm(CompiledMapping, odin.Mapping):
     """Maps SourceSubject to Term object."""
     from_obj = SourceSubject
     to_obj = Term
@@ -558,7 +569,7 @@ class SourceSubjectToTerm(odin.Mapping):
         return transform_group(value, "terms")
 
 
-class SourceAgentCorporateEntityToAgentReference(odin.Mapping):
+class SourceAgentCorporateEntityToAgentReference(CompiledMapping, odin.Mapping):
     """Maps SourceAgentCorporateEntity to an AgentReference object."""
     from_obj = SourceAgentCorporateEntity
     to_obj = AgentReference
@@ -580,7 +591,7 @@ class SourceAgentCorporateEntityToAgentReference(odin.Mapping):
         return "creator"
 
 
-class SourceAgentCorporateEntityToAgent(odin.Mapping):
+class SourceAgentCorporateEntityToAgent(CompiledMapping, odin.Mapping):
     """Maps SourceAgentCorporateEntity to Agent object."""
     from_obj = SourceAgentCorporateEntity
     to_obj = Agent
@@ -623,7 +634,7 @@ class SourceAgentCorporateEntityToAgent(odin.Mapping):
         return transform_group(value, "agents")
 
 
-class SourceAgentFamilyToAgentReference(odin.Mapping):
+class SourceAgentFamilyToAgentReference(CompiledMapping, odin.Mapping):
     """Maps SourceAgentCorporateEntity to an AgentReference object."""
     from_obj = SourceAgentFamily
     to_obj = AgentReference
@@ -645,7 +656,7 @@ class SourceAgentFamilyToAgentReference(odin.Mapping):
         return "creator"
 
 
-class SourceAgentFamilyToAgent(odin.Mapping):
+class SourceAgentFamilyToAgent(CompiledMapping, odin.Mapping):
     """Maps SourceAgentFamily to Agent object."""
     from_obj = SourceAgentFamily
     to_obj = Agent
@@ -688,7 +699,7 @@ class SourceAgentFamilyToAgent(odin.Mapping):
         return transform_group(value, "agents")
 
 
-class SourceAgentPersonToAgentReference(odin.Mapping):
+class SourceAgentPersonToAgentReference(CompiledMapping, odin.Mapping):
     """Maps SourceAgentCorporateEntity to an AgentReference object."""
     from_obj = SourceAgentPerson
     to_obj = AgentReference
@@ -710,7 +721,7 @@ class SourceAgentPersonToAgentReference(odin.Mapping):
         return "creator"
 
 
-class SourceAgentPersonToAgent(odin.Mapping):
+class SourceAgentPersonToAgent(CompiledMapping, odin.Mapping):
     """Maps SourceAgentPerson to Agent object."""
     from_obj = SourceAgentPerson
     to_obj = Agent
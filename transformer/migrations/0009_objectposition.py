@@ -0,0 +1,26 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transformer', '0008_alter_dataobject_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectPosition',
+            fields=[
+                ('data_object', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='transformer.dataobject')),
+                ('group', models.CharField(max_length=255)),
+                ('position', models.IntegerField()),
+                ('recorded', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'position'], name='transformer_group_60f5ab_idx')],
+            },
+        ),
+    ]
@@ -15,3 +15,18 @@ class DataObject(models.Model):
     online_pending = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
+
+
+class ObjectPosition(models.Model):
+    """The position of a collection or object within its group.
+
+    Used to shift the positions of other DataObjects in the same group when a
+    collection or object is added, moved or removed.
+    """
+    data_object = models.OneToOneField(DataObject, primary_key=True, on_delete=models.CASCADE)
+    group = models.CharField(max_length=255)
+    position = models.IntegerField()
+    recorded = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["group", "position"])]
@@ -0,0 +1,56 @@
+"""Process pool for transforming data outside of the calling process.
+
+Transformation and validation are CPU-bound, so running them in separate
+processes allows them to use more than one core. Worker processes are started
+once and reused, and set up Django and import mappings when they start, so no
+setup cost is paid per object.
+
+This module is imported by worker processes before Django is set up, so models
+must not be imported at module level.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor(max_workers):
+    """Returns a process pool executor, starting worker processes if necessary.
+
+    Args:
+        max_workers (int): number of worker processes.
+    """
+    global executor
+    with executor_lock:
+        if not executor:
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=get_context("spawn"),
+                initializer=setup_worker)
+        return executor
+
+
+def setup_worker():
+    """Sets up Django and imports transformer code in a worker process."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pisces.settings")
+    django.setup()
+    from . import transformers  # noqa: F401
+
+
+def transform(object_type, data, online=None):
+    """Transforms and validates data in a worker process.
+
+    Returns:
+        tuple: transformed data, a boolean indicating if the object is pending
+            an online asset and the number of seconds spent validating it.
+    """
+    from .transformers import Transformer
+    transformer = Transformer()
+    transformed, online_pending = transformer.transform(object_type, data, online)
+    return transformed, online_pending, transformer.validation_time
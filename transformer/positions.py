@@ -0,0 +1,120 @@
+"""Maintains the positions of collections and objects within their groups.
+
+Positions are recorded when DataObjects are saved. When a collection or object
+is added, moved or removed, the positions of other DataObjects in the same group
+are shifted in the database, rather than being recalculated from ArchivesSpace
+when each of them is next updated.
+
+Positions recorded since a fetch started were calculated after any changes it
+handles, so they are never shifted by that fetch.
+"""
+
+from django.db import transaction
+from django.db.models import F, Func, JSONField, Value
+
+from .models import DataObject, ObjectPosition
+
+
+class ShiftedPosition(Func):
+    """DataObject data with an amount added to its position.
+
+    The position is changed in the database, so that other data saved
+    concurrently is not overwritten.
+    """
+    output_field = JSONField()
+
+    def __init__(self, delta):
+        super().__init__(F("data"), Value(delta))
+
+    def compile_arguments(self, compiler):
+        data, data_params = compiler.compile(self.source_expressions[0])
+        delta, delta_params = compiler.compile(self.source_expressions[1])
+        return data, delta, (*data_params, *data_params, *delta_params)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        data, delta, params = self.compile_arguments(compiler)
+        return "JSON_SET({0}, '$.position', JSON_EXTRACT({0}, '$.position') + {1})".format(data, delta), params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        data, delta, params = self.compile_arguments(compiler)
+        return "JSONB_SET({0}, '{{position}}', TO_JSONB(({0} ->> 'position')::integer + {1}))".format(data, delta), params
+
+
+def update_position(data_object, since):
+    """Records the position of a saved DataObject.
+
+    A DataObject which is new to its group shifts later DataObjects in the
+    group down by one. A DataObject which has left a group, or moved within
+    it, shifts later DataObjects in the group it left up by one.
+
+    Args:
+        data_object (DataObject): a saved collection or object.
+        since (datetime): the time the current fetch started.
+    """
+    group = data_object.data["group"]["identifier"]
+    position = data_object.data["position"]
+    with transaction.atomic():
+        existing = ObjectPosition.objects.filter(data_object=data_object).first()
+        if existing and (existing.group, existing.position) == (group, position):
+            return
+        if existing:
+            shift_positions(existing.group, existing.position + 1, -1, since, data_object.pk)
+        shift_positions(group, position, 1, since, data_object.pk)
+        ObjectPosition.objects.update_or_create(
+            data_object=data_object, defaults={"group": group, "position": position})
+
+
+def record_positions():
+    """Records the positions of all saved collections and objects, replacing
+    any positions which have already been recorded.
+
+    Used when positions are first shifted, since positions are only recorded
+    when DataObjects are saved.
+
+    Returns:
+        int: the number of positions recorded.
+    """
+    positions = []
+    with transaction.atomic():
+        ObjectPosition.objects.all().delete()
+        for es_id, data in DataObject.objects.filter(object_type__in=["collection", "object"]).values_list("es_id", "data").iterator():
+            if data.get("group") and data.get("position") is not None:
+                positions.append(ObjectPosition(data_object_id=es_id, group=data["group"]["identifier"], position=data["position"]))
+        ObjectPosition.objects.bulk_create(positions, batch_size=1000)
+    return len(positions)
+
+
+def remove_positions(es_ids, since):
+    """Removes the positions of deleted DataObjects, shifting later DataObjects
+    in their groups up by one.
+
+    Args:
+        es_ids (list): identifiers of deleted DataObjects.
+        since (datetime): the time the current fetch started.
+    """
+    with transaction.atomic():
+        for removed in ObjectPosition.objects.filter(data_object__in=es_ids).order_by("-position"):
+            shift_positions(removed.group, removed.position + 1, -1, since)
+            removed.delete()
+
+
+def shift_positions(group, start, delta, since, exclude=None):
+    """Shifts the positions of DataObjects in a group which were recorded
+    before a fetch started, other than a DataObject which is being moved.
+
+    Positions are locked in primary key order before they are shifted, so
+    concurrent shifts in the same group happen one after the other, and are
+    shifted in the database without loading DataObjects.
+
+    Args:
+        group (str): identifier of the group.
+        start (int): lowest position to shift.
+        delta (int): amount to add to each position.
+        since (datetime): the time the current fetch started.
+        exclude (str): optional identifier of a DataObject not to shift.
+    """
+    es_ids = list(ObjectPosition.objects.select_for_update().filter(
+        group=group, position__gte=start, recorded__lt=since).exclude(pk=exclude).order_by("pk").values_list("pk", flat=True))
+    for i in range(0, len(es_ids), 1000):
+        ObjectPosition.objects.filter(pk__in=es_ids[i:i + 1000]).update(position=F("position") + delta)
+        DataObject.objects.filter(es_id__in=es_ids[i:i + 1000]).update(data=ShiftedPosition(delta), indexed=False)
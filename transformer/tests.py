@@ -1,19 +1,27 @@
 import json
 import os
 import random
+import tempfile
 from unittest.mock import patch
 
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from rac_schemas import is_valid
+from rac_schemas.exceptions import ValidationError
 from rest_framework.test import APIRequestFactory
 
 from fetcher.helpers import identifier_from_uri
 
+from .assets import OnlineAssetIndex
 from .cron import CheckMissingOnlineAssets
-from .mappings import has_online_instance, strip_tags
-from .models import DataObject
+from .mappings import has_online_asset, has_online_instance, strip_tags
+from .models import DataObject, ObjectPosition
+from .pool import get_executor, transform
+from .positions import record_positions, remove_positions
 from .resources.configs import NOTE_TYPE_CHOICES_TRANSFORM
 from .transformers import Transformer
+from .validators import get_validator, validate
 from .views import DataObjectUpdateByIdView, DataObjectViewSet
 
 object_types = ["agent_corporate_entity", "agent_family", "agent_person",
@@ -245,6 +253,36 @@ class TransformerTest(TestCase):
         self.assertEqual(updated.indexed, False)
         self.assertEqual(updated.online_pending, False)
 
+    @patch("requests.head")
+    def test_asset_index(self, mock_head):
+        """Ensures available assets are looked up in a manifest, which is only reloaded when it changes."""
+        for object_type in ["resource", "archival_object"]:
+            f = sorted(os.listdir(os.path.join("fixtures", "transformer", object_type)))[0]
+            with open(os.path.join("fixtures", "transformer", object_type, f), "r") as json_file:
+                Transformer().run(object_type, json.load(json_file))
+        DataObject.objects.update(online_pending=True)
+        available, missing = DataObject.objects.all()[:2]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest = os.path.join(tmpdir, "manifest.txt")
+            with open(manifest, "w") as mf:
+                mf.write("{}\n".format(available.es_id))
+            index = OnlineAssetIndex(manifest, 0)
+            with patch("transformer.mappings.asset_index", index):
+                self.assertTrue(has_online_asset(available.es_id))
+                self.assertFalse(has_online_asset(missing.es_id))
+                CheckMissingOnlineAssets().do()
+                with patch("transformer.assets.OnlineAssetIndex.parse") as mock_parse:
+                    index.refresh()
+                    mock_parse.assert_not_called()
+                with open(manifest, "a") as mf:
+                    mf.write("{}\n".format(missing.es_id))
+                self.assertTrue(has_online_asset(missing.es_id))
+        mock_head.assert_not_called()
+        available.refresh_from_db()
+        self.assertTrue(available.data["online"])
+        self.assertFalse(available.online_pending)
+        self.assertTrue(DataObject.objects.get(es_id=missing.es_id).online_pending)
+
     def test_transformer(self):
         self.mappings()
         self.views()
@@ -252,6 +290,87 @@ class TransformerTest(TestCase):
         self.online_pending()
         self.update_online_instances()
 
+    def test_transform_pool(self):
+        """Ensures data transformed in worker processes matches data transformed in process."""
+        sources = []
+        for object_type in object_types:
+            f = sorted(os.listdir(os.path.join("fixtures", "transformer", object_type)))[0]
+            with open(os.path.join("fixtures", "transformer", object_type, f), "r") as json_file:
+                sources.append((object_type, json.load(json_file)))
+        executor = get_executor(2)
+        futures = [executor.submit(transform, object_type, source) for object_type, source in sources]
+        for (object_type, source), future in zip(sources, futures):
+            transformed, online_pending, validation_time = future.result()
+            self.assertEqual((transformed, online_pending), Transformer().transform(object_type, source))
+            self.assertGreater(validation_time, 0)
+        self.assertEqual(DataObject.objects.count(), 0)
+
+    def test_validators(self):
+        """Ensures compiled validators give the same results as rac_schemas."""
+        for object_type, schema in [("agent_person", "agent.json"), ("resource", "collection.json"),
+                                    ("archival_object", "object.json"), ("subject", "term.json")]:
+            f = sorted(os.listdir(os.path.join("fixtures", "transformer", object_type)))[0]
+            with open(os.path.join("fixtures", "transformer", object_type, f), "r") as json_file:
+                transformed, _ = Transformer().transform(object_type, json.load(json_file))
+            self.assertTrue(validate(transformed, schema))
+            del transformed["external_identifiers"]
+            with self.assertRaises(ValidationError) as compiled_error:
+                validate(transformed, schema)
+            with self.assertRaises(ValidationError) as expected_error:
+                is_valid(transformed, schema)
+            self.assertEqual(str(compiled_error.exception), str(expected_error.exception))
+        self.assertIs(get_validator("object"), get_validator("object.json"))
+
+    @patch("transformer.mappings.requests.head")
+    def test_compiled_mappings(self, mock_head):
+        """Ensures data transformed by compiled mappings matches data transformed by Odin."""
+        mock_head.return_value.status_code = 404
+        for object_type in object_types:
+            for f in os.listdir(os.path.join("fixtures", "transformer", object_type)):
+                with open(os.path.join("fixtures", "transformer", object_type, f), "r") as json_file:
+                    source = json.load(json_file)
+                expected = Transformer().transform(object_type, source)
+                with patch("pisces.settings.COMPILED_MAPPINGS", True):
+                    self.assertEqual(Transformer().transform(object_type, source), expected)
+
+    @patch("pisces.settings.SHIFT_POSITIONS", True)
+    def test_positions(self):
+        """Ensures positions of other objects in a group are shifted when objects are added, moved or removed."""
+        def save(es_id, position, since):
+            Transformer().save_validated(
+                {"uri": "/objects/{}".format(es_id), "type": "object", "group": {"identifier": "/collections/1"}, "position": position},
+                False, since)
+
+        def positions():
+            return {obj.es_id: obj.data["position"] for obj in DataObject.objects.all()}
+
+        for position, es_id in enumerate(["a", "b", "c", "d"]):
+            save(es_id, position, timezone.now())
+        DataObject.objects.update(indexed=True)
+        since = timezone.now()
+        save("e", 1, since)
+        self.assertEqual(positions(), {"a": 0, "e": 1, "b": 2, "c": 3, "d": 4})
+        self.assertFalse(DataObject.objects.get(es_id="d").indexed)
+        self.assertTrue(DataObject.objects.get(es_id="a").indexed)
+        save("b", 4, since)
+        self.assertEqual(positions(), {"a": 0, "e": 1, "c": 2, "d": 3, "b": 4})
+        remove_positions(["a"], timezone.now())
+        self.assertEqual(
+            {es_id: position for es_id, position in positions().items() if es_id != "a"},
+            {"e": 0, "c": 1, "d": 2, "b": 3})
+        self.assertEqual(ObjectPosition.objects.count(), 4)
+        save("d", 0, timezone.now())
+        self.assertEqual(
+            {es_id: position for es_id, position in positions().items() if es_id != "a"},
+            {"d": 0, "e": 1, "c": 2, "b": 3})
+        self.assertEqual(ObjectPosition.objects.get(data_object="d").position, 0)
+
+        ObjectPosition.objects.all().delete()
+        self.assertEqual(record_positions(), 5)
+        self.assertEqual(
+            {p.data_object_id: p.position for p in ObjectPosition.objects.all()},
+            {"a": 0, "d": 0, "e": 1, "c": 2, "b": 3})
+
     def test_ping(self):
         response = self.client.get(reverse('ping'))
         self.assertEqual(response.status_code, 200)
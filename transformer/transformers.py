@@ -1,8 +1,9 @@
-import json
+import time
 
 from jsonschema.exceptions import ValidationError
-from odin.codecs import json_codec
-from rac_schemas import is_valid
+from odin.codecs import dict_codec
+
+from pisces import settings
 
 from .mappings import (SourceAgentCorporateEntityToAgent,
                        SourceAgentFamilyToAgent, SourceAgentPersonToAgent,
@@ -10,9 +11,11 @@ from .mappings import (SourceAgentCorporateEntityToAgent,
                        SourceArchivalObjectToObject,
                        SourceResourceToCollection, SourceSubjectToTerm)
 from .models import DataObject
+from .positions import update_position
 from .resources.source import (SourceAgentCorporateEntity, SourceAgentFamily,
                                SourceAgentPerson, SourceArchivalObject,
                                SourceResource, SourceSubject)
+from .validators import validate
 
 
 class TransformError(Exception):
@@ -31,16 +34,37 @@ class Transformer:
         data (dict): the source data to be transformed.
     """
 
-    def run(self, object_type, data):
+    validation_time = 0
+
+    def run(self, object_type, data, since=None, online=None):
+        transformed, online_pending = self.transform(object_type, data, online)
+        try:
+            self.save_validated(transformed, online_pending, since)
+        except Exception as e:
+            raise TransformError("Error transforming {} {}: {}".format(object_type, self.identifier, str(e)))
+        return transformed
+
+    def transform(self, object_type, data, online=None):
+        """Transforms and validates data without saving it.
+
+        Args:
+            online (bool): whether the object has an online asset, if this has
+                already been looked up.
+
+        Returns:
+            tuple: transformed data and a boolean indicating if the object is
+                pending an online asset.
+        """
         try:
             self.identifier = data.get("uri")
             from_resource, mapping, schema = self.get_mapping_classes(object_type)
-            transformed = self.get_transformed_object(data, from_resource, mapping)
+            transformed = self.get_transformed_object(data, from_resource, mapping, online)
             online_pending = self.get_online_pending(
                 data.get("instances", []), transformed.get("online", False))
-            is_valid(transformed, schema)
-            self.save_validated(transformed, online_pending)
-            return transformed
+            start = time.monotonic()
+            validate(transformed, schema)
+            self.validation_time = time.monotonic() - start
+            return transformed, online_pending
         except ValidationError as e:
             raise TransformError("Transformed data is invalid: {}".format(e))
         except Exception as e:
@@ -71,39 +95,36 @@ class Transformer:
             return True
         return False
 
-    def get_transformed_object(self, data, from_resource, mapping):
-        from_obj = json_codec.loads(json.dumps(data), resource=from_resource)
-        transformed = json.loads(json_codec.dumps(mapping.apply(from_obj)))
-        return self.remove_keys_from_dict(transformed)
-
-    def remove_keys_from_dict(self, data, target_key="$"):
-        """Removes all matching keys from dict."""
-        modified_dict = {}
-        if hasattr(data, 'items'):
-            for key, value in data.items():
-                if key != target_key:
-                    if isinstance(value, dict):
-                        modified_dict[key] = self.remove_keys_from_dict(data[key])
-                    elif isinstance(value, list):
-                        modified_dict[key] = [self.remove_keys_from_dict(i) for i in data[key]]
-                    else:
-                        modified_dict[key] = value
-        else:
-            return data
-        return modified_dict
-
-    def save_validated(self, data, online_pending):
+    def get_transformed_object(self, data, from_resource, mapping, online=None):
+        """Maps data to a new resource and returns it as a dict.
+
+        Data is loaded into resources and dumped from them directly, without
+        being serialized, and type fields are never added to the output.
+        """
+        from_obj = dict_codec.load(data, resource=from_resource)
+        context = {"online": online} if online is not None else None
+        return dict_codec.dump(mapping.apply(from_obj, context), include_type_field=False)
+
+    def save_validated(self, data, online_pending, since=None):
+        """Saves validated data as a DataObject.
+
+        If positions are shifted and the time the current fetch started is
+        provided, the positions of other collections and objects in the same
+        group are updated.
+        """
         es_id = data["uri"].split("/")[-1]
         try:
-            existing = DataObject.objects.get(es_id=es_id)
-            existing.data = data
-            existing.indexed = False
-            existing.online_pending = online_pending
-            existing.save()
+            data_object = DataObject.objects.get(es_id=es_id)
+            data_object.data = data
+            data_object.indexed = False
+            data_object.online_pending = online_pending
+            data_object.save()
         except DataObject.DoesNotExist:
-            DataObject.objects.create(
+            data_object = DataObject.objects.create(
                 es_id=es_id,
                 object_type=data["type"],
                 data=data,
                 indexed=False,
                 online_pending=online_pending)
+        if settings.SHIFT_POSITIONS and since and data["type"] in ["collection", "object"] and data.get("group") and data.get("position") is not None:
+            update_position(data_object, since)
@@ -0,0 +1,88 @@
+"""Validation of transformed data against RAC schemas.
+
+`rac_schemas.is_valid` reads and compiles a schema every time it is called.
+Here each schema is read and compiled once per process, with references to
+other schemas replaced by the schemas they refer to, so that validating data
+only applies a compiled validator. Invalid data is validated again by
+`rac_schemas`, so that errors are reported exactly as they were before.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import jsonschema
+from rac_schemas import handle_schema_filename, is_date, is_valid, schemas_dir
+
+CustomValidator = jsonschema.validators.extend(
+    jsonschema.Draft7Validator,
+    type_checker=jsonschema.Draft7Validator.TYPE_CHECKER.redefine("date", is_date),
+    validators=dict(jsonschema.Draft7Validator.VALIDATORS, date=is_date))
+
+validators = {}
+validators_lock = threading.Lock()
+
+
+def load_schema(filename):
+    with open(Path(schemas_dir) / filename, "r") as sf:
+        return json.load(sf)
+
+
+def resolve_refs(schema, document, documents):
+    """Returns a copy of a schema with references replaced by the schemas they
+    refer to.
+
+    Args:
+        schema (dict): the schema or part of a schema to resolve.
+        document (dict): the schema document which contains `schema`, against
+            which references without a filename are resolved.
+        documents (dict): schema documents keyed by filename.
+    """
+    if isinstance(schema, list):
+        return [resolve_refs(v, document, documents) for v in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        filename, _, pointer = schema["$ref"].partition("#")
+        if filename:
+            if filename not in documents:
+                documents[filename] = load_schema(filename)
+            document = documents[filename]
+        target = document
+        for part in [p for p in pointer.split("/") if p]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        return resolve_refs(target, document, documents)
+    return {k: resolve_refs(v, document, documents) for k, v in schema.items()}
+
+
+def get_validator(schema_name):
+    """Returns a compiled validator for a schema, compiling it if necessary."""
+    filename = handle_schema_filename(schema_name)
+    try:
+        return validators[filename]
+    except KeyError:
+        with validators_lock:
+            if filename not in validators:
+                schema = load_schema(filename)
+                documents = {"base.json": load_schema("base.json")}
+                validators[filename] = CustomValidator(resolve_refs(schema, schema, documents))
+            return validators[filename]
+
+
+def validate(data, schema_name):
+    """Validates data against a RAC schema.
+
+    Raises the same errors as `rac_schemas.is_valid`.
+
+    Args:
+        data (dict): data to be validated.
+        schema_name (str): the schema against which the data should be validated.
+    """
+    if not isinstance(data, dict):
+        raise TypeError(
+            "Data to be validated must be a dict, got {} instead".format(
+                type(data)))
+    if get_validator(schema_name).is_valid(data):
+        return True
+    return is_valid(data, schema_name)